@@ -1,18 +1,54 @@
 import os
+import asyncio
+import shutil
+import hashlib
+import functools
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from collections import OrderedDict
 import requests
-import librosa
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
-from volcenginesdkarkruntime import Ark
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from typing import Optional, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import json
-import base64
-import mimetypes
-from pathlib import Path
 from PIL import Image
 import io
+import mmap
 import time
+import wave
+
+try:
+    import fcntl
+except ImportError:  # Windows下无fcntl，缓存写入只加进程内的线程锁
+    fcntl = None
+
+try:
+    from pybase64 import b64encode  # 可选：SIMD加速的base64编码
+except ImportError:
+    from base64 import b64encode
+
+try:
+    # 可选：orjson解析/序列化JSON约为标准库的2-3倍速度
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
+    _json_dumps = lambda obj: json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+try:
+    # 可选：libjpeg-turbo的SIMD编码器，JPEG编码约为Pillow的2倍速度
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # 未安装PyTurboJPEG或找不到libturbojpeg
+    _turbo_jpeg = None
 
 # ================================
 # 核心配置参数
@@ -34,7 +70,9 @@ OUTPUT_CONFIG = {
     "base_dir": "output",
     "voice_dir": "voice",
     "image_dir": "image", 
-    "video_dir": "video"
+    "video_dir": "video",
+    "tts_cache_dir": "tts_cache",
+    "prompt_cache_db": "prompt_cache.db"
 }
 
 # 文件处理配置
@@ -81,12 +119,20 @@ VIDEO_CONFIG = {
     "max_duration": 30,
     "default_duration": 5,
     "max_wait_time": 300,
-    "check_interval": 10
+    "initial_check_interval": 1,  # 首次轮询间隔（秒），之后按1.5倍递增
+    "max_check_interval": 15,     # 轮询间隔上限（秒）
+    "download_workers": 4,        # 视频分块并行下载的线程数
+    "parallel_download_min_mb": 8, # 小于该大小的视频直接顺序下载
+    "progress_interval": 0.1,     # 下载进度最短刷新间隔（秒）
+    "download_retries": 3,        # 任务成功后下载视频的最大重试次数
+    "reference_image_by_url": True # 参考图为本次生成的图片时直接传其URL，而非base64数据
 }
 
 # 更加写实的提示词模板配置
+# 静态规则放在system消息开头，动态内容只出现在末尾的human消息中，
+# 便于支持前缀缓存的模型服务命中提示词缓存
 PROMPT_TEMPLATES = {
-    "image_generation": """作为专业的摄影师和视觉艺术总监，请将以下AI新闻内容转换为极其真实的摄影场景描述。并限制描述的长度，避免超过100字。
+    "image_generation": """作为专业的摄影师和视觉艺术总监，请将用户给出的AI新闻内容转换为极其真实的摄影场景描述。并限制描述的长度，避免超过100字。
 
 要求：
 1. 采用纪实摄影风格，画面真实自然，具有新闻摄影质感
@@ -99,14 +145,15 @@ PROMPT_TEMPLATES = {
 8.减少对显示器以及其他带有文字的部件的描述，注重场景，因为该生成模型对文字的生成支持不好
 9.输出仅保留相关场景描述即可，无需说明扩充后的提示词长度
 
-新闻内容：{news_content}
+请用专业摄影术语描述一个真实可拍摄的场景，仿佛是为新闻报道拍摄的照片。""",
 
-请用专业摄影术语描述一个真实可拍摄的场景，仿佛是为新闻报道拍摄的照片：""",
+    "image_generation_input": """---
+新闻内容：{news_content}""",
 
-    "video_generation": """作为专业的纪录片导演，请将以下AI新闻内容转换为真实的视频拍摄场景描述。并限制描述的长度，避免超过100字。
+    "video_generation": """作为专业的纪录片导演，请将用户给出的AI新闻内容转换为真实的视频拍摄场景描述。并限制描述的长度，避免超过100字。
 
 要求：
-1. 时长：{duration}秒的真实纪录片风格画面
+1. 时长：与用户给出的时长一致的真实纪录片风格画面
 2. 拍摄风格：类似BBC或CNN新闻纪录片的真实感
 3. 场景描述：现代化办公室、科技公司、研发中心等真实环境
 4. 镜头运动：缓慢推拉、平移，模拟专业摄像师操作
@@ -117,56 +164,210 @@ PROMPT_TEMPLATES = {
 9.减少对显示器以及其他带有文字的部件的描述，注重场景，因为该生成模型对文字的生成支持不好
 10.输出仅保留相关场景描述即可，无需说明扩充后的提示词长度
 
+请描述一个可以真实拍摄的纪录片场景。""",
+
+    "video_generation_input": """---
 新闻内容：{news_content}
+时长：{duration}秒""",
+
+    # 一次调用同时产出图像和视频提示词，后面会拼接上面两段要求
+    "dual_generation": """请根据用户给出的AI新闻内容，一次性完成图像提示词和视频提示词两项改写。
+只输出一个JSON对象，不要输出任何其他文字或代码块标记，格式为：
+{{"image_prompt": "图像场景描述", "video_prompt": "视频场景描述"}}
+视频时长由系统另行控制，video_prompt按短视频镜头描述即可。""",
+
+    "dual_generation_input": """---
+新闻内容：{news_content}""",
+
+    # 批量版本：输入为新闻内容的JSON数组，按相同顺序输出结果数组
+    "dual_generation_batch": """用户会给出一个JSON数组，每个元素是一条AI新闻内容。请对每条新闻分别完成图像提示词和视频提示词两项改写。
+只输出一个JSON数组，不要输出任何其他文字或代码块标记，数组长度和顺序必须与输入一致，每个元素格式为：
+{{"image_prompt": "图像场景描述", "video_prompt": "视频场景描述"}}
+视频时长由系统另行控制，video_prompt按短视频镜头描述即可。""",
 
-请描述一个可以真实拍摄的{duration}秒纪录片场景："""
+    "dual_generation_batch_input": """---
+新闻列表：{news_list}"""
 }
 
 # ================================
 # 工具类定义
 # ================================
 
+def _download_to_file(url, file_path, chunk_size=1 << 16, session=None):
+    """流式下载URL内容到文件，避免将整个响应读入内存，返回HTTP状态码"""
+    with (session or requests).get(url, stream=True, timeout=(5, 60)) as response:
+        if response.status_code != 200:
+            return response.status_code
+        response.raw.decode_content = True
+        with open(file_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=chunk_size)
+        return response.status_code
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_llm(model, api_key, base_url):
+    """按模型与接入点复用ChatOpenAI客户端，多个机器人实例共享其连接池"""
+    return ChatOpenAI(
+        temperature=0.0,
+        model=model,
+        openai_api_key=api_key,
+        openai_api_base=base_url
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _shared_ark_client(base_url, api_key):
+    """按接入点复用Ark客户端，首次使用时才导入SDK"""
+    from volcenginesdkarkruntime import Ark
+    return Ark(
+        base_url=base_url,
+        api_key=api_key,
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def _chat_template(system_template, human_template):
+    """按模板文本缓存ChatPromptTemplate，PROMPT_TEMPLATES被修改后自动使用新模板"""
+    return ChatPromptTemplate.from_messages([
+        ("system", system_template),
+        ("human", human_template)
+    ])
+
+
+class _ProgressWriter:
+    """包装文件对象，写入时按最短间隔打印下载进度"""
+    
+    def __init__(self, f, total_size, interval):
+        self.f = f
+        self.total_size = total_size
+        self.interval = interval
+        self.downloaded = 0
+        self.next_report = 0.0
+    
+    def write(self, data):
+        written = self.f.write(data)
+        self.downloaded += len(data)
+        if time.monotonic() >= self.next_report:
+            self._report()
+            self.next_report = time.monotonic() + self.interval
+        return written
+    
+    def finish(self):
+        self.total_size = self.total_size or self.downloaded
+        self._report()
+    
+    def _report(self):
+        percent = int(100 * self.downloaded / self.total_size) if self.total_size > 0 else 0
+        print(f"\r下载进度: {percent}% [{self.downloaded}/{self.total_size} bytes]", end="")
+
+
+# 进程内按缓存路径加的线程锁；无fcntl时是唯一的锁，有fcntl时也避免同进程线程各自占用文件锁
+_tts_path_locks = {}
+_tts_path_locks_guard = threading.Lock()
+
+
 class BytedanceTTS:
-    def __init__(self, url=None, voice_type=None):
+    def __init__(self, url=None, voice_type=None, session=None):
         self.url = url or API_CONFIG["tts_url"]
         self.voice_type = voice_type or API_CONFIG["voice_type"]
         self.headers = {"Content-Type": "application/json"}
+        # 可传入共享的requests.Session以复用连接
+        self.session = session or requests.Session()
         
     def generate(self, text, output_file=None):
         if output_file is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_dir = os.path.join(OUTPUT_CONFIG["base_dir"], "tts_output")
             os.makedirs(output_dir, exist_ok=True)
-            output_file = os.path.join(output_dir, f"tts_{timestamp}.wav")
+            output_file = os.path.join(output_dir, f"tts_{timestamp}_{uuid.uuid4().hex[:8]}.wav")
         
+        # 相同文本和音色的音频按内容寻址缓存，命中时直接硬链接到输出路径
+        cache_path = self._cache_path(text)
+        if os.path.exists(cache_path):
+            print(f"命中TTS缓存: {cache_path}")
+        else:
+            with self._cache_lock(cache_path):
+                if not os.path.exists(cache_path):
+                    self._synthesize(text, cache_path)
+        
+        self._link_from_cache(cache_path, output_file)
+        print(f"音频已保存至 {output_file}")
+        return output_file
+    
+    def _cache_path(self, text):
+        """根据文本和音色计算缓存文件路径"""
+        key = hashlib.sha256(text.encode("utf-8") + b"|" + self.voice_type.encode("utf-8")).hexdigest()
+        cache_dir = os.path.join(OUTPUT_CONFIG["base_dir"], OUTPUT_CONFIG["tts_cache_dir"])
+        os.makedirs(cache_dir, exist_ok=True)
+        return os.path.join(cache_dir, f"{key}.wav")
+    
+    @contextmanager
+    def _cache_lock(self, cache_path):
+        """对缓存条目加排他锁，避免并发任务重复请求同一段音频；跨进程的文件锁仅在有fcntl时使用"""
+        with _tts_path_locks_guard:
+            path_lock = _tts_path_locks.setdefault(cache_path, threading.Lock())
+        with path_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(cache_path + ".lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _synthesize(self, text, cache_path):
+        """请求TTS服务并原子地写入缓存文件"""
         data = {
             "text": text,
             "voice_type": self.voice_type
         }
         
-        response = requests.post(self.url, headers=self.headers, json=data)
+        response = self.session.post(self.url, headers=self.headers, json=data)
         
-        if response.status_code == 200:
-            with open(output_file, "wb") as f:
-                f.write(response.content)
-            print(f"音频已保存至 {output_file}")
-            return output_file
-        else:
+        if response.status_code != 200:
             error_msg = f"请求失败，状态码: {response.status_code}, 错误信息: {response.text}"
             print(error_msg)
             raise Exception(error_msg)
+        
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(response.content)
+        os.replace(tmp_path, cache_path)
+    
+    @staticmethod
+    def _link_from_cache(cache_path, output_file):
+        """将缓存音频硬链接到输出路径，跨文件系统时退化为复制
+        
+        先链接或复制到本线程独占的临时路径再原子替换，绝不直接写入可能是缓存硬链接的输出文件。
+        """
+        tmp_path = f"{output_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(cache_path, tmp_path)
+        except OSError:
+            shutil.copyfile(cache_path, tmp_path)
+        os.replace(tmp_path, output_file)
 
 
 class ArkImageGenerator:
-    def __init__(self, api_key=None, base_url=None, model=None):
+    def __init__(self, api_key=None, base_url=None, model=None, session=None):
         api_key = api_key or API_CONFIG["api_key"]
         base_url = base_url or API_CONFIG["base_url"]
         self.model = model or API_CONFIG["image_model"]
-        
-        self.client = Ark(
-            base_url=base_url,
-            api_key=api_key,
-        )
+        # 下载生成结果时使用的连接池，可与其他组件共享
+        self.session = session or requests.Session()
+        self.api_key = api_key
+        self.base_url = base_url
+        # 本地图片路径 -> 生成接口返回的图片URL，供视频生成直接引用
+        self.source_urls = {}
+    
+    @property
+    def client(self):
+        """首次生成图像时才导入并创建Ark客户端，Ark SDK导入较慢"""
+        return _shared_ark_client(self.base_url, self.api_key)
     
     def generate(self, prompt: str, output_dir: str = None, filename: Optional[str] = None, 
                  size: str = None, response_format: str = None, 
@@ -210,16 +411,11 @@ class ArkImageGenerator:
         
         response = self.client.images.generate(**generation_params)
         
-        saved_paths = []
-        
+        # 先确定所有下载目标，再并行下载，保持结果顺序
+        targets = []
         for i, image_data in enumerate(response.data):
             image_url = image_data.url
             
-            image_response = requests.get(image_url)
-            if image_response.status_code != 200:
-                print(f"下载图像失败: {image_response.status_code}")
-                continue
-            
             if filename is None:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 if len(response.data) > 1:
@@ -231,12 +427,25 @@ class ArkImageGenerator:
                     file_path = os.path.join(output_dir, f"{filename}_{i}.png")
                 else:
                     file_path = os.path.join(output_dir, f"{filename}.png")
-            
-            with open(file_path, 'wb') as f:
-                f.write(image_response.content)
+            targets.append((image_url, file_path))
+        
+        if not targets:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(8, len(targets))) as executor:
+            status_codes = list(executor.map(
+                lambda t: _download_to_file(*t, session=self.session), targets
+            ))
+        
+        saved_paths = []
+        for (image_url, file_path), status_code in zip(targets, status_codes):
+            if status_code != 200:
+                print(f"下载图像失败: {status_code}")
+                continue
             
             print(f"图像已保存至: {file_path}")
             saved_paths.append(file_path)
+            self.source_urls[file_path] = image_url
         
         return saved_paths
 
@@ -246,30 +455,73 @@ class ArkImageGenerator:
 # ================================
 
 class MultimodalNewsBot:
+    # 本进程内已创建过的输出目录，避免每次实例化都重复makedirs
+    _dirs_ready = set()
+    # 进程内所有实例共享的图片编码结果（data URI可达十几MB），只保留最近几张
+    _encoded_images = OrderedDict()
+    _encoded_images_lock = threading.Lock()
+    _encoded_images_max = 4
+    
     def __init__(self, custom_config=None):
         """初始化多模态新闻播报机器人"""
         # 允许自定义配置覆盖默认配置
         if custom_config:
             self._update_config(custom_config)
         
-        # 初始化各个组件
-        self.tts = BytedanceTTS()
-        self.image_generator = ArkImageGenerator()
-        self.video_client = Ark(
-            base_url=API_CONFIG["base_url"],
-            api_key=API_CONFIG["api_key"],
+        # 语音合成、图像下载以及视频任务的创建、轮询和下载共用同一连接池，避免每次请求重新握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504],
+                              raise_on_status=False)
         )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        # 初始化各个组件
+        self.tts = BytedanceTTS(session=self.session)
+        self.image_generator = ArkImageGenerator(session=self.session)
         
         # 初始化提示词优化模型
-        self.llm = ChatOpenAI(
-            temperature=0.0,
-            model=API_CONFIG["llm_model"],
-            openai_api_key=API_CONFIG["api_key"],
-            openai_api_base=API_CONFIG["base_url"]
-        )
+        self.llm = _shared_llm(API_CONFIG["llm_model"], API_CONFIG["api_key"], API_CONFIG["base_url"])
         
         # 创建输出目录
         self._setup_directories()
+        
+        # temperature为0时提示词优化结果是确定的，按输入缓存到内存和SQLite
+        self._prompt_memo = {}
+        self._prompt_cache_lock = threading.Lock()
+        # 多个实例（如各工作线程的bot）共用同一数据库文件：WAL模式下读写互不阻塞，写锁冲突时最多等待30秒
+        self._prompt_cache = sqlite3.connect(
+            os.path.join(self.base_output_dir, OUTPUT_CONFIG["prompt_cache_db"]),
+            timeout=30,
+            check_same_thread=False
+        )
+        try:
+            self._prompt_cache.execute("PRAGMA journal_mode=WAL")
+            self._prompt_cache.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache (key TEXT PRIMARY KEY, value TEXT, ts REAL)"
+            )
+            self._prompt_cache.commit()
+        except sqlite3.OperationalError as e:
+            print(f"提示词缓存初始化失败: {e}")
+    
+    def close(self):
+        """关闭提示词缓存的数据库连接"""
+        with self._prompt_cache_lock:
+            self._prompt_cache.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @property
+    def video_client(self):
+        """Ark SDK客户端，视频任务已改走HTTP接口，仅在外部调用时才创建"""
+        return _shared_ark_client(API_CONFIG["base_url"], API_CONFIG["api_key"])
     
     def _update_config(self, custom_config):
         """更新配置参数"""
@@ -297,101 +549,313 @@ class MultimodalNewsBot:
         self.video_dir = os.path.join(self.base_output_dir, OUTPUT_CONFIG["video_dir"])
         
         for dir_path in [self.voice_dir, self.image_dir, self.video_dir]:
-            os.makedirs(dir_path, exist_ok=True)
+            if dir_path not in self._dirs_ready:
+                os.makedirs(dir_path, exist_ok=True)
+                self._dirs_ready.add(dir_path)
     
     def get_mimetype(self, file_path):
         """获取文件的MIME类型"""
-        mime_type, _ = mimetypes.guess_type(file_path)
-        if not mime_type or not mime_type.startswith('image/'):
-            ext = Path(file_path).suffix.lower()
-            mime_type = FILE_CONFIG["supported_image_formats"].get(ext)
-        
+        # 直接按扩展名查表，不经过mimetypes数据库
+        mime_type = FILE_CONFIG["supported_image_formats"].get(os.path.splitext(file_path)[1].lower())
         if not mime_type:
             raise ValueError(f"不支持的图片格式: {file_path}")
         return mime_type
 
+    @staticmethod
+    def _is_jpeg_file(image_path) -> bool:
+        """按文件头(SOI标记)判断内容是否为JPEG，不依赖扩展名"""
+        with open(image_path, 'rb') as f:
+            return f.read(3) == b'\xff\xd8\xff'
+
+    def _to_jpeg_bytes(self, image_path) -> bytes:
+        """解码图片并在内存中重新编码为JPEG，透明通道以白色背景合成"""
+        with Image.open(image_path) as img:
+            # 如果图片有透明通道，转换为RGB
+            if img.mode in ('RGBA', 'LA', 'P'):
+                # 向量化地与白色背景做alpha混合：out = (rgb*a + 255*(255-a)) / 255
+                import numpy as np
+                arr = np.asarray(img.convert('RGBA'), dtype=np.uint16)
+                alpha = arr[..., 3:4]
+                out = (arr[..., :3] * alpha + 255 * (255 - alpha) + 127) // 255
+                img = Image.fromarray(out.astype(np.uint8), 'RGB')
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+            
+            if _turbo_jpeg is not None:
+                import numpy as np
+                return _turbo_jpeg.encode(np.asarray(img), quality=FILE_CONFIG["jpeg_quality"],
+                                          pixel_format=TJPF_RGB)
+            
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=FILE_CONFIG["jpeg_quality"], optimize=True, progressive=True)
+            return buffer.getvalue()
+
     def convert_to_jpeg_if_needed(self, image_path):
         """如果图片不是JPEG格式，转换为JPEG格式"""
         try:
             mime_type = self.get_mimetype(image_path)
             
-            # 如果已经是JPEG格式，直接返回
-            if mime_type == 'image/jpeg':
+            # 如果已经是JPEG格式（含扩展名不符但内容为JPEG的文件），直接返回
+            if mime_type == 'image/jpeg' or self._is_jpeg_file(image_path):
                 return image_path
             
             # 转换为JPEG格式
             print(f"检测到 {mime_type} 格式，正在转换为JPEG格式...")
+            jpeg_bytes = self._to_jpeg_bytes(image_path)
             
-            # 打开图片
-            with Image.open(image_path) as img:
-                # 如果图片有透明通道，转换为RGB
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    # 创建白色背景
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 生成新的文件路径
-                jpeg_path = os.path.splitext(image_path)[0] + '_converted.jpg'
-                
-                # 保存为JPEG格式
-                img.save(jpeg_path, 'JPEG', quality=FILE_CONFIG["jpeg_quality"], optimize=True)
-                print(f"图片已转换并保存为: {jpeg_path}")
-                
-                return jpeg_path
+            # 生成新的文件路径并保存
+            jpeg_path = os.path.splitext(image_path)[0] + '_converted.jpg'
+            with open(jpeg_path, 'wb') as f:
+                f.write(jpeg_bytes)
+            print(f"图片已转换并保存为: {jpeg_path}")
+            
+            return jpeg_path
                 
         except Exception as e:
             print(f"图片格式转换失败: {e}")
             return image_path  # 转换失败时返回原路径
 
     def encode_image(self, image_path):
-        """将图片编码为base64格式"""
+        """将图片编码为base64格式，同一文件未修改时复用上次的编码结果"""
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"图片文件不存在: {image_path}")
         
-        # 首先尝试转换图片格式
-        processed_image_path = self.convert_to_jpeg_if_needed(image_path)
+        # 以(绝对路径, 修改时间, 大小)为键，文件变化时自然失效
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        with self._encoded_images_lock:
+            encoded = self._encoded_images.get(key)
+            if encoded is not None:
+                self._encoded_images.move_to_end(key)
+                return encoded
         
-        file_size = os.path.getsize(processed_image_path)
+        encoded = self._encode_image_uncached(*key)
+        with self._encoded_images_lock:
+            self._encoded_images[key] = encoded
+            while len(self._encoded_images) > self._encoded_images_max:
+                self._encoded_images.popitem(last=False)
+        return encoded
+    
+    def _encode_image_uncached(self, image_path, mtime_ns, size):
+        """实际执行格式转换和base64编码，mtime_ns和size仅用作缓存键"""
+        # 先用原文件大小做检查，超限或为空时无需解码和转换
         max_size = FILE_CONFIG["max_image_size_mb"] * 1024 * 1024
-        if file_size > max_size:
-            raise ValueError(f"图片大小超出限制({FILE_CONFIG['max_image_size_mb']}MB): {file_size / 1024 / 1024:.2f}MB")
+        if size > max_size:
+            raise ValueError(f"图片大小超出限制({FILE_CONFIG['max_image_size_mb']}MB): {size / 1024 / 1024:.2f}MB")
+        if size == 0:
+            raise ValueError(f"图片文件为空: {image_path}")
+        
+        mime_type = self.get_mimetype(image_path)
         
-        mime_type = self.get_mimetype(processed_image_path)
+        # 生成的图片统一以.png保存，但内容常为JPEG，按文件头识别后无需解码
+        if mime_type != 'image/jpeg' and self._is_jpeg_file(image_path):
+            mime_type = 'image/jpeg'
         
-        with open(processed_image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-            data_uri = f"data:{mime_type};base64,{encoded_string}"
-            return data_uri
+        # 非JPEG图片在内存中转换后直接编码，不落盘中间文件
+        if mime_type != 'image/jpeg':
+            print(f"检测到 {mime_type} 格式，正在转换为JPEG格式...")
+            try:
+                jpeg_bytes = self._to_jpeg_bytes(image_path)
+            except Exception as e:
+                print(f"图片格式转换失败: {e}，使用原图编码")
+            else:
+                if len(jpeg_bytes) > max_size:
+                    raise ValueError(f"图片大小超出限制({FILE_CONFIG['max_image_size_mb']}MB): {len(jpeg_bytes) / 1024 / 1024:.2f}MB")
+                return "data:image/jpeg;base64," + b64encode(jpeg_bytes).decode('ascii')
+        
+        # 通过mmap直接编码文件内容，不在堆上保留原始字节副本；base64结果只做一次ASCII解码
+        with open(image_path, "rb") as image_file:
+            with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                encoded = b64encode(mm)
+        return f"data:{mime_type};base64," + encoded.decode('ascii')
     
-    def optimize_prompt_for_image(self, original_prompt: str) -> str:
-        """优化原始提示词用于图像生成"""
-        image_prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATES["image_generation"])
+    def optimize_prompt_for_image(self, original_prompt: str, skip_optimize: bool = False) -> str:
+        """优化原始提示词用于图像生成，skip_optimize为True时调用方保证内容已是提示词，直接使用"""
+        if skip_optimize:
+            return original_prompt.strip()
+        
+        image_prompt_template = _chat_template(PROMPT_TEMPLATES["image_generation"], PROMPT_TEMPLATES["image_generation_input"])
         messages = image_prompt_template.format_messages(news_content=original_prompt)
-        response = self.llm.invoke(messages)
-        return response.content.strip()
+        return self._invoke_llm_cached(messages)
+    
+    @staticmethod
+    def _dual_system_prompt(header: str) -> str:
+        """在合并改写的说明后拼接图像和视频两段要求"""
+        return "\n\n".join([
+            header,
+            "【image_prompt要求】\n" + PROMPT_TEMPLATES["image_generation"],
+            "【video_prompt要求】\n" + PROMPT_TEMPLATES["video_generation"]
+        ])
+    
+    def _dual_messages(self, original_prompt: str):
+        """构造单条新闻合并改写的消息"""
+        dual_prompt_template = _chat_template(
+            self._dual_system_prompt(PROMPT_TEMPLATES["dual_generation"]),
+            PROMPT_TEMPLATES["dual_generation_input"]
+        )
+        return dual_prompt_template.format_messages(news_content=original_prompt)
+    
+    def prefetch_report_prompts(self, news_prompts: List[str]) -> int:
+        """一次LLM调用批量改写多条新闻的图像/视频提示词，并写入提示词缓存
+        
+        之后对每条新闻调用optimize_prompts_for_report（包括其他实例）会直接命中缓存。
+        返回写入缓存的条数，批量解析失败时返回0，各条新闻仍可单独改写。
+        """
+        if (self.llm.temperature or 0) > 0:
+            return 0
+        
+        # 只处理需要改写且尚未缓存的新闻
+        pending = []
+        for text in dict.fromkeys(news_prompts):
+            key = self._prompt_cache_key(self._dual_messages(text))
+            if self._prompt_cache_get(key) is None:
+                pending.append((text, key))
+        if not pending:
+            return 0
+        
+        batch_prompt_template = _chat_template(
+            self._dual_system_prompt(PROMPT_TEMPLATES["dual_generation_batch"]),
+            PROMPT_TEMPLATES["dual_generation_batch_input"]
+        )
+        messages = batch_prompt_template.format_messages(
+            news_list=json.dumps([text for text, _ in pending], ensure_ascii=False)
+        )
+        
+        try:
+            content = self.llm.invoke(messages).content.strip()
+            content = content.removeprefix("```json").removeprefix("```").removesuffix("```")
+            items = _json_loads(content)
+            if len(items) != len(pending):
+                raise ValueError(f"返回{len(items)}条，期望{len(pending)}条")
+            values = []
+            for item in items:
+                image_prompt = item["image_prompt"].strip()
+                video_prompt = item["video_prompt"].strip()
+                if not image_prompt or not video_prompt:
+                    raise ValueError("存在空的提示词")
+                values.append(json.dumps({"image_prompt": image_prompt, "video_prompt": video_prompt},
+                                         ensure_ascii=False))
+        except Exception as e:
+            print(f"批量提示词优化失败: {e}，各条新闻将单独优化")
+            return 0
+        
+        for (_, key), value in zip(pending, values):
+            self._prompt_cache_put(key, value)
+        print(f"已批量优化 {len(pending)} 条新闻的提示词")
+        return len(pending)
+    
+    def optimize_prompts_for_report(self, original_prompt: str,
+                                    skip_optimize: bool = False) -> Optional[Tuple[str, str]]:
+        """一次LLM调用同时生成图像和视频提示词，返回(image_prompt, video_prompt)，解析失败返回None"""
+        if skip_optimize:
+            return original_prompt.strip(), original_prompt.strip()
+        
+        messages = self._dual_messages(original_prompt)
+        
+        try:
+            content = self._invoke_llm_cached(messages)
+            content = content.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+            prompts = _json_loads(content)
+            image_prompt = prompts["image_prompt"].strip()
+            video_prompt = prompts["video_prompt"].strip()
+        except Exception as e:
+            print(f"合并提示词优化失败: {e}，改为分别优化")
+            return None
+        
+        if not image_prompt or not video_prompt:
+            return None
+        return image_prompt, video_prompt
     
-    def optimize_prompt_for_video(self, original_prompt: str, audio_duration: float) -> str:
-        """优化原始提示词用于视频生成"""
+    def optimize_prompt_for_video(self, original_prompt: str, audio_duration: float,
+                                  skip_optimize: bool = False) -> str:
+        """优化原始提示词用于视频生成，skip_optimize为True时直接使用原始内容"""
+        if skip_optimize:
+            return original_prompt.strip()
+        
         # 确保时长在合理范围内
         duration = max(VIDEO_CONFIG["min_duration"], 
                       min(int(audio_duration), VIDEO_CONFIG["max_duration"]))
         
-        video_prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATES["video_generation"])
+        video_prompt_template = _chat_template(PROMPT_TEMPLATES["video_generation"], PROMPT_TEMPLATES["video_generation_input"])
         messages = video_prompt_template.format_messages(
             news_content=original_prompt,
             duration=duration
         )
-        response = self.llm.invoke(messages)
-        return response.content.strip()
+        return self._invoke_llm_cached(messages)
+    
+    def _invoke_llm_cached(self, messages) -> str:
+        """调用LLM并缓存结果，键为模型名与完整消息内容的sha256"""
+        if (self.llm.temperature or 0) > 0:
+            return self.llm.invoke(messages).content.strip()
+        
+        key = self._prompt_cache_key(messages)
+        value = self._prompt_cache_get(key)
+        if value is None:
+            value = self.llm.invoke(messages).content.strip()
+            self._prompt_cache_put(key, value)
+        return value
+    
+    @staticmethod
+    def _prompt_cache_key(messages) -> str:
+        """计算提示词缓存键"""
+        key_source = json.dumps([API_CONFIG["llm_model"], [m.content for m in messages]], ensure_ascii=False)
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+    
+    def _prompt_cache_get(self, key: str) -> Optional[str]:
+        """依次查询内存和SQLite中的提示词缓存，未命中返回None"""
+        cached = self._prompt_memo.get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            with self._prompt_cache_lock:
+                row = self._prompt_cache.execute(
+                    "SELECT value FROM prompt_cache WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"读取提示词缓存失败: {e}")
+            return None
+        
+        if row:
+            self._prompt_memo[key] = row[0]
+            return row[0]
+        return None
+    
+    def _prompt_cache_put(self, key: str, value: str):
+        """写入内存和SQLite中的提示词缓存，数据库写入失败时只保留内存缓存"""
+        self._prompt_memo[key] = value
+        with self._prompt_cache_lock:
+            try:
+                self._prompt_cache.execute(
+                    "INSERT OR REPLACE INTO prompt_cache (key, value, ts) VALUES (?, ?, ?)",
+                    (key, value, time.time())
+                )
+                self._prompt_cache.commit()
+            except sqlite3.Error as e:
+                print(f"写入提示词缓存失败: {e}")
+                try:
+                    self._prompt_cache.rollback()
+                except sqlite3.Error:
+                    pass
     
     def get_audio_duration(self, audio_file_path: str) -> float:
-        """获取音频文件时长"""
+        """获取音频文件时长，优先只读取文件头，不解码音频数据"""
+        if audio_file_path.lower().endswith(".wav"):
+            try:
+                with wave.open(audio_file_path, "rb") as wav_file:
+                    return wav_file.getnframes() / wav_file.getframerate()
+            except (wave.Error, EOFError):
+                pass  # 非PCM编码的WAV交给soundfile处理
+        
+        try:
+            import soundfile
+            return soundfile.info(audio_file_path).duration
+        except Exception:
+            pass
+        
         try:
+            # librosa会连带导入numba/scipy，仅在前面的方式都失败时加载
+            import librosa
             duration = librosa.get_duration(filename=audio_file_path)
             return duration
         except Exception as e:
@@ -401,17 +865,20 @@ class MultimodalNewsBot:
     def generate_voice(self, text: str, timestamp: str) -> str:
         """生成语音文件"""
         print("步骤 1: 生成语音文件...")
-        output_file = os.path.join(self.voice_dir, f"news_voice_{timestamp}.wav")
+        # 时间戳只精确到秒，加随机后缀避免并发片段共用同一输出文件
+        output_file = os.path.join(self.voice_dir, f"news_voice_{timestamp}_{uuid.uuid4().hex[:8]}.wav")
         voice_path = self.tts.generate(text, output_file=output_file)
         print(f"语音文件已生成: {voice_path}")
         return voice_path
     
     def generate_image(self, original_prompt: str, timestamp: str, 
                       size: str = None, ratio: str = None, 
-                      guidance_scale: float = None, seed: int = None) -> List[str]:
-        """生成图像文件"""
+                      guidance_scale: float = None, seed: int = None,
+                      optimized_prompt: str = None, skip_optimize: bool = False) -> List[str]:
+        """生成图像文件，传入optimized_prompt时不再单独调用LLM优化"""
         print("步骤 2: 优化提示词并生成图像...")
-        optimized_prompt = self.optimize_prompt_for_image(original_prompt)
+        if not optimized_prompt:
+            optimized_prompt = self.optimize_prompt_for_image(original_prompt, skip_optimize=skip_optimize)
         
         # 添加写实风格描述
         realistic_prompt = f"photorealistic, documentary style, professional photography, high quality, detailed, {optimized_prompt}"
@@ -440,10 +907,13 @@ class MultimodalNewsBot:
         return image_paths
     
     def generate_video(self, original_prompt: str, audio_duration: float, timestamp: str, 
-                    image_paths: List[str] = None, resolution: str = None, ratio: str = None) -> str:
-        """生成视频文件"""
+                    image_paths: List[str] = None, resolution: str = None, ratio: str = None,
+                    optimized_prompt: str = None, skip_optimize: bool = False) -> str:
+        """生成视频文件，传入optimized_prompt时不再单独调用LLM优化"""
         print("步骤 3: 优化提示词并生成视频...")
-        optimized_prompt = self.optimize_prompt_for_video(original_prompt, audio_duration)
+        if not optimized_prompt:
+            optimized_prompt = self.optimize_prompt_for_video(original_prompt, audio_duration,
+                                                              skip_optimize=skip_optimize)
         
         # 添加写实风格描述
         realistic_prompt = f"documentary style, realistic cinematography, professional videography, high quality, {optimized_prompt}"
@@ -468,12 +938,13 @@ class MultimodalNewsBot:
         # 如果有图片路径，添加图片内容
         if image_paths and len(image_paths) > 0:
             image_path = image_paths[0]
+            # 图片由本机刚生成时直接引用其URL，省去base64编码和上传
+            image_url = self.image_generator.source_urls.get(image_path) if VIDEO_CONFIG["reference_image_by_url"] else None
             try:
-                image_data_uri = self.encode_image(image_path)
                 content.append({
                     "type": "image_url",
                     "image_url": {
-                        "url": image_data_uri
+                        "url": image_url or self.encode_image(image_path)
                     }
                 })
                 print(f"已将图片 {image_path} 添加到视频生成请求")
@@ -505,10 +976,10 @@ class MultimodalNewsBot:
         base_url = f"{API_CONFIG['base_url']}/contents/generations/tasks"
         
         print("正在发送视频生成请求...")
-        response = requests.post(base_url, headers=headers, json=data)
+        response = self.session.post(base_url, headers=headers, data=_json_dumps(data))
         response.raise_for_status()
         
-        response_data = response.json()
+        response_data = _json_loads(response.content)
         task_id = response_data.get("id")
         if not task_id:
             raise ValueError("无法获取任务ID，请检查API响应")
@@ -522,9 +993,10 @@ class MultimodalNewsBot:
 
     def wait_and_download_video_http(self, task_id: str, timestamp: str) -> str:
         """使用HTTP请求等待视频生成完成并下载"""
-        max_wait_time = VIDEO_CONFIG["max_wait_time"]
-        check_interval = VIDEO_CONFIG["check_interval"]
-        waited_time = 0
+        # 指数退避轮询：任务很快完成时能及时发现，耗时较长时减少请求次数
+        check_interval = VIDEO_CONFIG["initial_check_interval"]
+        max_check_interval = VIDEO_CONFIG["max_check_interval"]
+        deadline = time.monotonic() + VIDEO_CONFIG["max_wait_time"]
         
         headers = {
             "Content-Type": "application/json",
@@ -534,13 +1006,24 @@ class MultimodalNewsBot:
         base_url = f"{API_CONFIG['base_url']}/contents/generations/tasks"
         
         last_status = None
-        while waited_time < max_wait_time:
+        url = f"{base_url}/{task_id}"
+        while time.monotonic() < deadline:
+            # 只有网络错误、429和5xx属于暂时性错误，继续轮询；连接层的重试与Retry-After由session处理
             try:
-                url = f"{base_url}/{task_id}"
-                response = requests.get(url, headers=headers)
+                response = self.session.get(url, headers=headers, timeout=(5, 30))
                 response.raise_for_status()
-                status_data = response.json()
-                
+                status_data = _json_loads(response.content)
+            except requests.HTTPError as e:
+                status_code = e.response.status_code if e.response is not None else None
+                if status_code is not None and status_code < 500 and status_code != 429:
+                    raise  # 鉴权失败、任务不存在等4xx错误重试无意义，直接失败
+                print(f"查询任务状态时出错: {str(e)}")
+                status_data = None
+            except (requests.RequestException, ValueError) as e:
+                print(f"查询任务状态时出错: {str(e)}")
+                status_data = None
+            
+            if status_data is not None:
                 status = status_data.get("status")
                 
                 # 仅当状态变化时才打印
@@ -563,7 +1046,7 @@ class MultimodalNewsBot:
                             video_url = results[0].get("url")
                     
                     if video_url:
-                        return self.download_video(video_url, timestamp)
+                        return self._download_with_retry(video_url, timestamp)
                     else:
                         print("错误: 无法从结果中获取视频URL")
                         print(f"响应内容: {json.dumps(status_data, indent=2)}")
@@ -573,51 +1056,107 @@ class MultimodalNewsBot:
                     error = status_data.get("failure_reason", "未知错误")
                     raise Exception(f"任务失败: {error}")
                 
-                elif status in ["pending", "queued", "running"]:
-                    time.sleep(check_interval)
-                    waited_time += check_interval
-                    continue
-                
-                else:
+                elif status not in ["pending", "queued", "running"]:
                     print(f"未知任务状态: {status}")
                     print(f"响应内容: {json.dumps(status_data, indent=2)}")
-                    time.sleep(check_interval)
-                    waited_time += check_interval
-                    
-            except Exception as e:
-                print(f"查询任务状态时出错: {str(e)}")
-                time.sleep(check_interval)
-                waited_time += check_interval
+            
+            time.sleep(min(check_interval, max(0.0, deadline - time.monotonic())))
+            check_interval = min(check_interval * 1.5, max_check_interval)
         
         raise Exception("视频生成超时")
         
+    def _download_with_retry(self, video_url: str, timestamp: str) -> str:
+        """任务已成功时下载出错只重试下载本身，避免调用方重新创建（并付费）视频任务"""
+        retries = VIDEO_CONFIG["download_retries"]
+        for attempt in range(retries + 1):
+            try:
+                return self.download_video(video_url, timestamp)
+            except (requests.RequestException, OSError) as e:
+                if attempt == retries:
+                    raise
+                delay = 2 ** attempt
+                print(f"下载视频出错: {str(e)}，{delay}秒后重试 ({attempt + 1}/{retries})")
+                time.sleep(delay)
+    
     def download_video(self, video_url: str, timestamp: str) -> str:
         """下载视频文件"""
         video_path = os.path.join(self.video_dir, f"news_video_{timestamp}.mp4")
         
         print(f"正在下载视频到: {video_path}")
-        response = requests.get(video_url, stream=True)
-        response.raise_for_status()
         
-        file_size = int(response.headers.get('content-length', 0))
+        # 服务端支持Range且文件较大时，按字节范围分块并行下载
+        total_size = self._probe_range_support(video_url)
+        if total_size >= VIDEO_CONFIG["parallel_download_min_mb"] * 1024 * 1024 and VIDEO_CONFIG["download_workers"] > 1:
+            try:
+                self._download_ranges(video_url, video_path, total_size, VIDEO_CONFIG["download_workers"])
+                print(f"视频下载完成: {video_path}")
+                return video_path
+            except Exception as e:
+                # 删除带空洞的预分配文件，避免被当作完整下载，然后退回单连接顺序下载
+                print(f"分块下载失败: {str(e)}，改为顺序下载")
+                if os.path.exists(video_path):
+                    os.remove(video_path)
         
-        # 下载并显示进度
-        with open(video_path, 'wb') as f:
-            downloaded = 0
-            for chunk in response.iter_content(chunk_size=1024*1024):  # 1MB chunks
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    percent = int(100 * downloaded / file_size) if file_size > 0 else 0
-                    print(f"\r下载进度: {percent}% [{downloaded}/{file_size} bytes]", end="")
+        with self.session.get(video_url, stream=True, timeout=(5, 60)) as response:
+            response.raise_for_status()
+            file_size = int(response.headers.get('content-length', 0))
+            
+            # 大缓冲区整块拷贝，进度由包装的文件对象限频打印
+            response.raw.decode_content = True
+            with open(video_path, 'wb') as f:
+                # 已知长度且未压缩传输时预分配文件大小，写完再按实际位置截断
+                if file_size > 0 and not response.headers.get('content-encoding'):
+                    f.truncate(file_size)
+                writer = _ProgressWriter(f, file_size, VIDEO_CONFIG["progress_interval"])
+                shutil.copyfileobj(response.raw, writer, length=8*1024*1024)
+                f.truncate()
         
+        writer.finish()
         print(f"\n视频下载完成: {video_path}")
         return video_path
     
+    def _probe_range_support(self, video_url: str) -> int:
+        """请求首字节探测服务端是否支持Range，支持时返回文件总大小，否则返回0
+        
+        使用GET而非HEAD：预签名的下载地址通常只对GET方法签名。
+        """
+        try:
+            with self.session.get(video_url, headers={"Range": "bytes=0-0"}, stream=True, timeout=(5, 60)) as response:
+                content_range = response.headers.get("content-range", "")
+                if response.status_code != 206 or "/" not in content_range:
+                    return 0
+                total = content_range.rsplit("/", 1)[1]
+                return int(total) if total.isdigit() else 0
+        except requests.RequestException:
+            return 0
+    
+    def _download_ranges(self, video_url: str, video_path: str, total_size: int, workers: int):
+        """按字节范围分块并行下载，各线程写入预分配文件的对应位置"""
+        with open(video_path, 'wb') as f:
+            f.truncate(total_size)
+        
+        part_size = -(-total_size // workers)
+        ranges = [(start, min(start + part_size, total_size) - 1) for start in range(0, total_size, part_size)]
+        
+        def fetch(byte_range):
+            start, end = byte_range
+            with self.session.get(video_url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=(5, 60)) as response:
+                if response.status_code != 206:
+                    raise Exception(f"分块下载失败，状态码: {response.status_code}")
+                with open(video_path, 'r+b') as f:
+                    f.seek(start)
+                    for chunk in response.iter_content(chunk_size=1024*1024):
+                        f.write(chunk)
+        
+        print(f"分 {len(ranges)} 块并行下载 [{total_size} bytes]")
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            list(executor.map(fetch, ranges))
+    
     def generate_news_report(self, news_prompt: str, image_ratio: str = None, video_ratio: str = None,
                            image_size: str = None, video_resolution: str = None,
-                           guidance_scale: float = None, seed: int = None) -> dict:
-        """生成完整的多模态新闻播报"""
+                           guidance_scale: float = None, seed: int = None,
+                           skip_optimize: bool = False) -> dict:
+        """生成完整的多模态新闻播报，skip_optimize为True时news_prompt已是图像/视频提示词，不再调用LLM改写"""
         print(f"开始生成多模态新闻播报...")
         print(f"原始新闻内容: {news_prompt}")
         
@@ -625,28 +1164,39 @@ class MultimodalNewsBot:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         try:
-            # 步骤1: 生成语音
-            voice_path = self.generate_voice(news_prompt, timestamp)
+            def image_stage():
+                # 一次LLM调用同时得到图像和视频提示词，视频阶段直接复用
+                prompts = self.optimize_prompts_for_report(news_prompt, skip_optimize=skip_optimize)
+                image_paths = self.generate_image(
+                    news_prompt, timestamp, 
+                    size=image_size, 
+                    ratio=image_ratio,
+                    guidance_scale=guidance_scale,
+                    seed=seed,
+                    optimized_prompt=prompts[0] if prompts else None
+                )
+                return image_paths, prompts[1] if prompts else None
             
-            # 获取音频时长
-            audio_duration = self.get_audio_duration(voice_path)
-            print(f"音频时长: {audio_duration:.2f}秒")
-            
-            # 步骤2: 生成图像
-            image_paths = self.generate_image(
-                news_prompt, timestamp, 
-                size=image_size, 
-                ratio=image_ratio,
-                guidance_scale=guidance_scale,
-                seed=seed
-            )
+            # 步骤1和步骤2互不依赖，语音和图像并行生成
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                voice_future = executor.submit(self.generate_voice, news_prompt, timestamp)
+                image_future = executor.submit(image_stage)
+                
+                # 获取音频时长
+                voice_path = voice_future.result()
+                audio_duration = self.get_audio_duration(voice_path)
+                print(f"音频时长: {audio_duration:.2f}秒")
+                
+                image_paths, video_prompt = image_future.result()
             
             # 步骤3: 生成视频 - 传递图片路径和视频参数
             video_path = self.generate_video(
                 news_prompt, audio_duration, timestamp, 
                 image_paths=image_paths,
                 resolution=video_resolution,
-                ratio=video_ratio
+                ratio=video_ratio,
+                optimized_prompt=video_prompt,
+                skip_optimize=skip_optimize
             )
             
             # 确定实际使用的参数
@@ -691,6 +1241,13 @@ class MultimodalNewsBot:
             }
             print(f"生成过程中出现错误: {e}")
             return error_result
+    
+    async def generate_news_report_async(self, news_prompt: str, **kwargs) -> dict:
+        """generate_news_report的异步版本，在工作线程中执行，供异步服务调用时不阻塞事件循环
+        
+        关键字参数与generate_news_report相同。
+        """
+        return await asyncio.to_thread(self.generate_news_report, news_prompt, **kwargs)
 
 
 # ================================
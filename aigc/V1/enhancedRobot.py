@@ -3,25 +3,85 @@
 
 import os
 import re
+import json
+import functools
 import shutil
 import subprocess
 import concurrent.futures
+import itertools
 import logging
 import math
 import uuid
+import hashlib
 import time
+import threading
 from datetime import datetime
-from aigc.airobot import MultimodalNewsBot
+from aigc.airobot import MultimodalNewsBot, API_CONFIG
 
 MAX_CHARS_PER_SEGMENT = 42
 MAX_WORKERS = 4
-TMP_DIR_ROOT = "output/segments"
+PERSISTENT_TMP_DIR_ROOT = "output/segments"
+
+
+def _pick_tmp_dir_root() -> str:
+    """
+    分段工作目录的位置：环境变量NEWS_TMP_ROOT优先；否则Linux下/dev/shm（tmpfs）剩余空间充足时放在内存盘，
+    中间文件读写不落盘；都不满足时使用output/segments
+    """
+    override = os.environ.get("NEWS_TMP_ROOT")
+    if override:
+        return override
+    try:
+        if os.path.isdir("/dev/shm") and shutil.disk_usage("/dev/shm").free > 2 * 1024 ** 3:
+            return "/dev/shm/segments"
+    except OSError:
+        pass
+    return PERSISTENT_TMP_DIR_ROOT
+
+
+TMP_DIR_ROOT = _pick_tmp_dir_root()
+SEGMENT_CACHE_ROOT = "output/segment_cache"   # 按分段文本内容寻址的成片缓存，重复运行时未改动的分段直接复用
 MAX_SEGMENT_DURATION = 10.0
 TRANSITION_DURATION = 0.5          # 单段淡入淡出时长
 LOG_FILE = "news_generation.log"
 VIDEO_BUFFER_RATIO = 1.15
 MAX_VIDEO_DURATION = 5.0
 RETRY_COUNT = 3
+DEBUG_SEGMENTS = os.environ.get("DEBUG", "1") != "0"   # DEBUG=0时不再探测仅供调试的媒体信息，成功的分段也不写调试信息文件
+# 分段等中间产物的编码参数：最终成片由add_gentle_intro_outro重新编码，中间产物用ultrafast换速度，
+# 以crf 18保留足够画质供二次编码；zerolatency关闭B帧和lookahead，降低单个ffmpeg进程的内存与延迟，
+# fastdecode关闭CABAC和去块滤波，最终成片编码解码这些分段时更快
+SEGMENT_X264_ARGS = ["-c:v", "libx264", "-preset", "ultrafast", "-crf", "18", "-tune", "fastdecode,zerolatency"]
+# 分段统一的帧率/分辨率/像素格式/档次，保证concat demuxer可以直接流复制；
+# 帧率取视频模型的原生24fps，避免补帧；分辨率对应默认的720p 16:9，其他比例等比缩放后加黑边
+SEGMENT_FPS = 24
+SEGMENT_FRAME_SIZE = (1280, 720)
+TIMELINE_SUBTITLES = False        # True时分段不带字幕，整片一份多条字幕在最终成片编码时统一烧录/封装
+BURN_SUBTITLES = True             # False时以mov_text软字幕封装，不再烧录进画面
+USE_HW_ENCODER = True             # 最终成片优先使用可用的硬件H.264编码器
+USE_HW_ENCODER_FOR_SEGMENTS = True  # 分段编码也使用硬件编码器，释放CPU给并发的字幕渲染和其他分段
+# 每个分段编码进程的线程数，并发的MAX_WORKERS个分段合计约占满全部CPU；
+# 可用环境变量OPTIMIZER_FFMPEG_THREADS覆盖（1~64）
+def _ffmpeg_threads_per_invocation() -> int:
+    default = max(1, (os.cpu_count() or 4) // MAX_WORKERS)
+    override = os.environ.get("OPTIMIZER_FFMPEG_THREADS")
+    if not override:
+        return default
+    try:
+        return min(64, max(1, int(override)))
+    except ValueError:
+        return default
+
+
+FFMPEG_THREADS = _ffmpeg_threads_per_invocation()
+# 烧录字幕的渲染方式："ass"写出ASS文件交给libass（逐字回退字体，中文最稳妥）；
+# "drawtext"直接把文本内联进滤镜，不写字幕文件也不初始化libass，需SUBTITLE_FONT含中文字形
+SUBTITLE_RENDERER = "ass"
+SUBTITLE_FONT = "Noto Sans CJK SC"
+# MP4输入的快速探测参数：mov解复用器无论probesize多小都会完整读取moov，
+# 流参数已知，省去默认的数MB探测和逐帧分析
+FAST_INPUT_ARGS = ["-probesize", "32", "-analyzeduration", "0", "-fpsprobesize", "0", "-fflags", "+discardcorrupt"]
+SUBTITLE_FORCE_STYLE = "FontSize=20,PrimaryColour=&Hffffff,OutlineColour=&H000000,Outline=2,Alignment=2,MarginV=50"
 
 # ---- Logging 配置 ---- 
 logging.basicConfig(
@@ -39,8 +99,129 @@ def generate_unique_id():
     return f"{int(time.time()*1000)}_{uuid.uuid4().hex[:8]}"
 
 
-def run_cmd(cmd: list[str], cwd=None):
-    subprocess.run(cmd, check=True, cwd=cwd)
+# Windows下不为每个ffmpeg子进程分配控制台窗口
+_POPEN_CREATIONFLAGS = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+
+def _with_fast_input_probe(cmd: list[str]) -> list[str]:
+    """在每个MP4文件输入的-i之前插入FAST_INPUT_ARGS；音频、字幕、lavfi、concat列表等输入保持默认探测"""
+    out = []
+    options_start = 1  # 当前输入的输入选项从上一个输入文件之后开始
+    for i, arg in enumerate(cmd):
+        if arg == "-i" and i + 1 < len(cmd):
+            # 显式指定了-f的输入（如concat列表）不按MP4处理
+            if cmd[i + 1].lower().endswith(".mp4") and "-f" not in cmd[options_start:i]:
+                out.extend(FAST_INPUT_ARGS)
+            options_start = i + 2
+        out.append(arg)
+    return out
+
+
+def run_cmd(cmd: list[str], cwd=None, threads: int | None = None):
+    """threads只用于并发执行的分段编码；最终成片等单独运行的编码不限制线程数"""
+    if cmd[0] == "ffmpeg":
+        # 只输出错误信息，不打印banner和逐帧进度
+        cmd = [cmd[0], "-hide_banner", "-loglevel", "error", "-nostats"] + cmd[1:]
+        if threads and "-threads" not in cmd:
+            # 作为输出选项插在输出文件之前，限制编码线程数，避免并发分段争抢CPU
+            cmd = cmd[:-1] + ["-threads", str(threads)] + cmd[-1:]
+        if "-probesize" not in cmd:
+            cmd = _with_fast_input_probe(cmd)
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            creationflags=_POPEN_CREATIONFLAGS)
+    _, err = proc.communicate()
+    if proc.returncode:
+        err = err.decode("utf-8", errors="replace").strip()
+        logging.error(f"Command failed ({proc.returncode}): {' '.join(cmd)}\n{err}")
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=err)
+
+
+@functools.lru_cache(maxsize=1024)
+def _probe_media_cached(path: str, mtime_ns: int, size: int) -> dict:
+    """单次ffprobe取出时长与视频流信息，按(路径, 修改时间, 大小)缓存；无效结果抛异常不入缓存"""
+    result = subprocess.run([
+        "ffprobe", "-v", "error",
+        "-print_format", "json",
+        "-show_format", "-show_streams",
+        path
+    ], capture_output=True, text=True, check=True)
+    data = json.loads(result.stdout)
+    duration = float(data.get("format", {}).get("duration") or 0)
+    if duration <= 0:
+        raise ValueError(f"Invalid duration: {duration}")
+    info = {"duration": duration}
+    video = next((st for st in data.get("streams", []) if st.get("codec_type") == "video"), None)
+    if video:
+        info.update(width=video.get("width"), height=video.get("height"), fps=video.get("r_frame_rate"))
+    return info
+
+
+def probe_media(path: str) -> dict:
+    stat = os.stat(path)
+    return _probe_media_cached(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+# 硬件编码器及其码率/质量参数，按优先级排列；libx264为兜底
+_HW_H264_ENCODERS = [
+    ("h264_nvenc", ["-preset", "p4", "-tune", "hq", "-b:v", "4M"]),
+    ("h264_qsv", ["-global_quality", "23"]),
+    ("h264_videotoolbox", ["-b:v", "4M"]),
+]
+
+
+@functools.lru_cache(maxsize=1)
+def available_hw_encoder() -> tuple | None:
+    """
+    返回可用的硬件H.264编码器及其参数，没有则返回None。编码器列表里有不代表有可用的设备，
+    因此对每个候选做一次极短的试编码，首个成功的即被采用，结果在进程内缓存。
+    """
+    try:
+        encoders = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"],
+                                  capture_output=True, text=True).stdout
+    except OSError:
+        return None
+    for name, params in _HW_H264_ENCODERS:
+        if name not in encoders:
+            continue
+        probe = subprocess.run([
+            "ffmpeg", "-hide_banner", "-v", "error",
+            "-f", "lavfi", "-i", "color=c=black:s=256x256:d=0.1",
+            "-c:v", name, "-f", "null", "-"
+        ], capture_output=True)
+        if probe.returncode == 0:
+            logging.info(f"Hardware encoder available: {name}")
+            return ("-c:v", name, *params)
+    return None
+
+
+def segment_video_codec_args(final_quality: bool = False) -> tuple:
+    """
+    分段等中间产物的视频编码参数：开启USE_HW_ENCODER_FOR_SEGMENTS且有硬件编码器时使用硬件编码。
+    final_quality为True时分段会直接流复制为成片，使用成片的编码参数
+    """
+    if final_quality:
+        return final_video_codec_args()
+    if USE_HW_ENCODER_FOR_SEGMENTS:
+        hw_args = available_hw_encoder()
+        if hw_args:
+            return hw_args
+    return software_video_codec_args()
+
+
+def final_video_codec_args() -> tuple:
+    """返回最终成片使用的视频编码参数"""
+    if USE_HW_ENCODER:
+        hw_args = available_hw_encoder()
+        if hw_args:
+            return hw_args
+    return software_video_codec_args(final_quality=True)
+
+
+def software_video_codec_args(final_quality: bool = False) -> tuple:
+    """libx264编码参数，硬件编码器不可用或运行时失败（如并发会话数超限）时使用"""
+    if final_quality:
+        return ("-c:v", "libx264", "-preset", "medium", "-crf", "23")
+    return tuple(SEGMENT_X264_ARGS)
 
 
 def safe_get_media_duration(path: str, max_retries: int = 3) -> float:
@@ -48,18 +229,7 @@ def safe_get_media_duration(path: str, max_retries: int = 3) -> float:
         try:
             if not os.path.exists(path):
                 raise FileNotFoundError(f"Media file not found: {path}")
-            time.sleep(0.5)
-            result = subprocess.run([
-                "ffprobe", "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                path
-            ], capture_output=True, text=True, check=True)
-            duration = float(result.stdout.strip())
-            if duration > 0:
-                return duration
-            else:
-                raise ValueError(f"Invalid duration: {duration}")
+            return probe_media(path)["duration"]
         except (subprocess.CalledProcessError, ValueError, FileNotFoundError) as e:
             logging.warning(f"Attempt {attempt + 1} failed to get duration for {path}: {e}")
             if attempt < max_retries - 1:
@@ -83,95 +253,17 @@ def safe_get_media_duration(path: str, max_retries: int = 3) -> float:
 def get_media_info(path: str) -> dict:
     try:
         duration = safe_get_media_duration(path)
-        result = subprocess.run([
-            "ffprobe", "-v", "error",
-            "-select_streams", "v:0",
-            "-show_entries", "stream=width,height,r_frame_rate",
-            "-of", "csv=s=x:p=0",
-            path
-        ], capture_output=True, text=True)
-        if result.returncode == 0 and result.stdout.strip():
-            parts = result.stdout.strip().split('x')
-            if len(parts) >= 3:
-                width, height, fps = parts[0], parts[1], parts[2]
-                return {
-                    "duration": duration,
-                    "width": int(width) if width.isdigit() else None,
-                    "height": int(height) if height.isdigit() else None,
-                    "fps": fps
-                }
-        return {"duration": duration}
+        try:
+            info = dict(probe_media(path))
+        except (subprocess.CalledProcessError, ValueError, OSError):
+            info = {}
+        info["duration"] = duration
+        return info
     except Exception as e:
         logging.warning(f"Failed to get media info for {path}: {e}")
         return {"duration": 0}
 
 
-def create_precise_video_segment(video_path: str, start_time: float, duration: float, output_path: str):
-    cmd = [
-        "ffmpeg", "-y",
-        "-ss", f"{start_time:.3f}",
-        "-i", video_path,
-        "-t", f"{duration:.3f}",
-        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
-        "-avoid_negative_ts", "make_zero",
-        "-fflags", "+genpts",
-        "-an",
-        output_path
-    ]
-    run_cmd(cmd)
-
-
-def extend_video_smoothly(video_path: str, target_duration: float, output_path: str):
-    current_duration = safe_get_media_duration(video_path)
-    if current_duration >= target_duration:
-        create_precise_video_segment(video_path, 0, target_duration, output_path)
-        logging.info(f"[Video] Precise trim {current_duration:.3f}s → {target_duration:.3f}s")
-    else:
-        loops_needed = math.ceil(target_duration / current_duration)
-        if loops_needed <= 3:
-            cmd = [
-                "ffmpeg", "-y",
-                "-stream_loop", str(loops_needed - 1),
-                "-i", video_path,
-                "-t", f"{target_duration:.3f}",
-                "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
-                "-avoid_negative_ts", "make_zero",
-                "-fflags", "+genpts",
-                "-an", output_path
-            ]
-        else:
-            cmd = [
-                "ffmpeg", "-y",
-                "-i", video_path,
-                "-filter:v", f"setpts={current_duration/target_duration:.3f}*PTS",
-                "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
-                "-an", output_path
-            ]
-        logging.info(f"[Video] Smooth extend {current_duration:.3f}s → {target_duration:.3f}s")
-        run_cmd(cmd)
-
-
-def create_aligned_video(video_path: str, audio_duration: float, output_path: str):
-    current_duration = safe_get_media_duration(video_path)
-    # Add a small buffer to ensure audio completes (0.3s extra)
-    target_duration = audio_duration + 0.3
-    if current_duration >= target_duration:
-        create_precise_video_segment(video_path, 0, target_duration, output_path)
-        logging.info(f"[Video] Precise trim {current_duration:.3f}s → {target_duration:.3f}s")
-    else:
-        # If video is too short, extend it
-        extend_video_smoothly(video_path, target_duration, output_path)
-        logging.info(f"[Video] Extended {current_duration:.3f}s → {target_duration:.3f}s")
-
-
-def format_timestamp(sec: float) -> str:
-    h = int(sec // 3600)
-    m = int((sec % 3600) // 60)
-    s = int(sec % 60)
-    ms = int((sec - int(sec)) * 1000)
-    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
-
-
 def split_subtitle_text(text: str, max_chars_per_line: int = 18) -> str:
     if len(text) <= max_chars_per_line:
         return text
@@ -201,58 +293,153 @@ def split_subtitle_text(text: str, max_chars_per_line: int = 18) -> str:
     return f"{line1}\\N{line2}"
 
 
-def create_subtitle_file(text: str, duration: float, srt_path: str):
-    formatted_text = split_subtitle_text(text)
-    with open(srt_path, "w", encoding="utf-8") as f:
-        f.write("1\n")
-        f.write(f"{format_timestamp(0)} --> {format_timestamp(duration)}\n")
-        f.write(formatted_text + "\n")
+def format_ass_timestamp(sec: float) -> str:
+    cs = int(round(sec * 100))
+    return f"{cs // 360000}:{cs // 6000 % 60:02d}:{cs // 100 % 60:02d}.{cs % 100:02d}"
 
 
-def add_subtitles_to_video(video_path: str, srt_path: str, output_path: str):
-    video_path = os.path.abspath(video_path)
-    srt_path = os.path.abspath(srt_path)
-    output_path = os.path.abspath(output_path)
-    if not os.path.exists(video_path):
-        raise FileNotFoundError(f"Video file not found: {video_path}")
-    if not os.path.exists(srt_path):
-        raise FileNotFoundError(f"Subtitle file not found: {srt_path}")
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", video_path,
-        "-vf", f"subtitles='{srt_path}':force_style='FontSize=20,PrimaryColour=&Hffffff,OutlineColour=&H000000,Outline=2,Alignment=2,MarginV=50'",
-        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
-        "-c:a", "copy",
-        output_path
-    ]
-    logging.info(f"[Subtitle] Add subtitles → {output_path}")
-    run_cmd(cmd)
+# 与SRT经libass渲染时的默认画布和SUBTITLE_FORCE_STYLE保持一致的样式
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 384
+PlayResY: 288
+ScaledBorderAndShadow: yes
 
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,20,&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,50,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def write_ass_subtitle_file(cues: list[tuple[float, float, str]], ass_path: str):
+    """
+    直接写出带固定样式的ASS字幕，libass无需再把SRT转换为ASS并套用force_style；cues为(开始, 结束, 文本)
+    """
+    with open(ass_path, "w", encoding="utf-8") as f:
+        f.write(ASS_HEADER)
+        for start, end, text in cues:
+            f.write(f"Dialogue: 0,{format_ass_timestamp(start)},{format_ass_timestamp(end)},Default,,0,0,0,,"
+                    f"{split_subtitle_text(text)}\n")
+
+
+def create_ass_subtitle_file(text: str, duration: float, ass_path: str):
+    write_ass_subtitle_file([(0, duration, text)], ass_path)
 
-def merge_audio_video_precise(video_path: str, audio_path: str, output_path: str):
-    if not os.path.exists(video_path):
-        raise FileNotFoundError(f"Video file not found: {video_path}")
-    if not os.path.exists(audio_path):
-        raise FileNotFoundError(f"Audio file not found: {audio_path}")
-    video_duration = safe_get_media_duration(video_path)
-    audio_duration = safe_get_media_duration(audio_path)
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", video_path,
-        "-i", audio_path,
-        "-c:v", "copy",
-        "-c:a", "aac", "-b:a", "128k", "-ar", "44100",
-        "-map", "0:v:0", "-map", "1:a:0",
-        # Remove the -shortest flag to prevent audio cutoff
-        "-t", f"{max(video_duration, audio_duration):.3f}",
-        "-avoid_negative_ts", "make_zero",
-        "-fflags", "+genpts+igndts",
-        "-vsync", "cfr",
-        "-async", "1",
-        output_path
-    ]
-    logging.info(f"[Merge] Precise sync A({audio_duration:.3f}s)+V({video_duration:.3f}s) → {output_path}")
-    run_cmd(cmd)
+
+def _escape_filter_value(value: str) -> str:
+    """
+    滤镜参数值的两层转义：先转义 \\ ' : 给滤镜选项解析，再用单引号包住交给滤镜图解析
+    """
+    value = re.sub(r"([\\':])", r"\\\1", value).replace("'", "'\\''")
+    return f"'{value}'"
+
+
+@functools.lru_cache(maxsize=256)
+def subtitle_filter(sub_path: str) -> str:
+    """ASS字幕用ass滤镜直接渲染，其他格式经subtitles滤镜并套用统一样式；路径取绝对路径并转义后缓存"""
+    # Windows路径统一为正斜杠，盘符后的冒号由转义处理
+    escaped = _escape_filter_value(os.path.abspath(sub_path).replace("\\", "/"))
+    if sub_path.lower().endswith(".ass"):
+        return f"ass={escaped}"
+    return f"subtitles={escaped}:force_style='{SUBTITLE_FORCE_STYLE}'"
+
+
+def drawtext_filter(text: str) -> str:
+    """
+    与ASS默认样式等效的drawtext滤镜（按288行画布等比缩放字号和底边距），文本内联，无需字幕文件
+    """
+    text = _escape_filter_value(split_subtitle_text(text).replace("\\N", "\n"))
+    return (f"drawtext=font='{SUBTITLE_FONT}':text={text}:expansion=none:"
+            f"fontsize=h*20/288:fontcolor=white:borderw=2:bordercolor=black:"
+            f"x=(w-text_w)/2:y=h-text_h-h*50/288")
+
+
+def build_segment_in_one_pass(video_path: str, audio_path: str, srt_path: str | None,
+                              audio_duration: float, output_path: str, fade: float = 0.0,
+                              subtitle_text: str | None = None, final_quality: bool = False) -> float:
+    """
+    一次ffmpeg编码完成对齐到音频时长（裁剪/循环/慢放）、烧录字幕、合并音频以及可选的淡入淡出，
+    不产生中间文件。srt_path为None时用drawtext内联烧录subtitle_text，两者都为None时不加字幕。返回输出时长。
+    """
+    if srt_path is None and subtitle_text is not None and not BURN_SUBTITLES:
+        raise ValueError("Inline drawtext subtitles require BURN_SUBTITLES")
+    for path, kind in ((video_path, "Video"), (audio_path, "Audio"), (srt_path, "Subtitle")):
+        if path is not None and not os.path.exists(path):
+            raise FileNotFoundError(f"{kind} file not found: {path}")
+
+    current_duration = safe_get_media_duration(video_path)
+    # Add a small buffer to ensure audio completes (0.3s extra)
+    target_duration = audio_duration + 0.3
+
+    input_args = ["-i", video_path]
+    speed_filter = ""
+    if current_duration < target_duration:
+        loops_needed = math.ceil(target_duration / current_duration)
+        if loops_needed <= 3:
+            input_args = ["-stream_loop", str(loops_needed - 1), "-i", video_path]
+        else:
+            speed_filter = f"setpts={current_duration/target_duration:.3f}*PTS,"
+
+    video_filter = (f"[0:v]{speed_filter}trim=duration={target_duration:.3f},setpts=PTS-STARTPTS,"
+                    f"fps={SEGMENT_FPS}")
+    width, height = SEGMENT_FRAME_SIZE
+    video_filter += (f",scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                     f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1")
+    subtitle_inputs, subtitle_args = [], []
+    if srt_path is None:
+        if subtitle_text is not None:
+            video_filter += f",{drawtext_filter(subtitle_text)}"
+    elif BURN_SUBTITLES:
+        video_filter += f",{subtitle_filter(srt_path)}"
+    else:
+        # 软字幕作为mov_text字幕轨封装，不参与画面渲染
+        subtitle_inputs = ["-i", os.path.abspath(srt_path)]
+        subtitle_args = ["-map", "2:s", "-c:s", "mov_text", "-metadata:s:s:0", "language=chi"]
+    # 音频末尾补静音到目标时长，音视频等长，流复制拼接时分段边界不会累积音画错位
+    audio_filter = f"[1:a]apad=whole_dur={target_duration:.3f}"
+    if fade > 0:
+        fade = min(fade, target_duration / 4)  # 防止fade时长过长
+        fade_out_start = target_duration - fade
+        video_filter += f",fade=t=in:st=0:d={fade:.3f},fade=t=out:st={fade_out_start:.3f}:d={fade:.3f}"
+        # 音频淡出在语音结束处完成，而不是在补出的静音里
+        audio_fade = min(fade, audio_duration / 4)
+        audio_filter = (f"[1:a]afade=t=in:st=0:d={audio_fade:.3f},"
+                        f"afade=t=out:st={max(0.0, audio_duration - audio_fade):.3f}:d={audio_fade:.3f},"
+                        f"apad=whole_dur={target_duration:.3f}")
+
+    def segment_cmd(codec_args):
+        return [
+            "ffmpeg", "-y",
+            *input_args,
+            "-i", audio_path,
+            *subtitle_inputs,
+            "-filter_complex", f"{video_filter}[v];{audio_filter}[a]",
+            "-map", "[v]", "-map", "[a]",
+            *subtitle_args,
+            *codec_args,
+            "-pix_fmt", "yuv420p", "-profile:v", "main",
+            "-c:a", "aac", "-b:a", "128k", "-ar", "44100", "-ac", "2",
+            "-t", f"{target_duration:.3f}",
+            "-avoid_negative_ts", "make_zero",
+            "-movflags", "+faststart",
+            output_path
+        ]
+
+    codec_args = segment_video_codec_args(final_quality)
+    logging.info(f"[Segment] One-pass align+subtitle+mux+fade {current_duration:.3f}s → {target_duration:.3f}s → {output_path}")
+    try:
+        run_cmd(segment_cmd(codec_args), threads=FFMPEG_THREADS)
+    except subprocess.CalledProcessError:
+        fallback_args = software_video_codec_args(final_quality)
+        if codec_args == fallback_args:
+            raise
+        # 试编码通过不代表并发时可用（消费级NVENC限制同时会话数），失败时用libx264重编一次
+        logging.warning(f"[Segment] Hardware encoder {codec_args[1]} failed, retrying with libx264 → {output_path}")
+        run_cmd(segment_cmd(fallback_args), threads=FFMPEG_THREADS)
+    return target_duration
 
 
 def wait_for_video_generation(bot, text: str, max_wait: int = 60):
@@ -282,6 +469,10 @@ def wait_for_video_generation(bot, text: str, max_wait: int = 60):
                 raise e
 
 
+_SENT_SPLIT_RE = re.compile(r"(?<=[。！？；])")
+_CLAUSE_PUNCT = "，、：；"
+
+
 def smart_chunk_text(text: str, max_chars: int = MAX_CHARS_PER_SEGMENT) -> list[str]:
     paras = [p.strip() for p in text.splitlines() if p.strip()]
     chunks = []
@@ -291,34 +482,38 @@ def smart_chunk_text(text: str, max_chars: int = MAX_CHARS_PER_SEGMENT) -> list[
             if len(t) >= 5: 
                 chunks.append(t)
             continue
-        sents = re.split(r"(?<=[。！？；])", p)
-        cur = ""
+        sents = _SENT_SPLIT_RE.split(p)
+        cur_parts, cur_len = [], 0
         for s in sents:
             s = s.strip()
             if not s: 
                 continue
             if len(s) > max_chars:
-                if cur:
-                    chunks.append(cur.strip())
-                    cur = ""
-                while len(s) > max_chars:
-                    cut = max_chars
-                    for i in range(max_chars-1, max_chars//2, -1):
-                        if s[i] in "，、：；":
-                            cut = i+1
-                            break
-                    chunks.append(s[:cut].strip())
-                    s = s[cut:].strip()
-                if s: 
-                    cur = s
+                if cur_parts:
+                    chunks.append("".join(cur_parts).strip())
+                    cur_parts, cur_len = [], 0
+                # 用起始下标推进而不是反复切出剩余部分，超长句也只扫描一遍
+                start = 0
+                while len(s) - start > max_chars:
+                    # 在后半段内取最靠后的一个分句标点处断开，找不到则硬切
+                    end = start + max_chars
+                    pos = max(s.rfind(c, start + max_chars//2 + 1, end) for c in _CLAUSE_PUNCT)
+                    cut = pos + 1 if pos >= 0 else end
+                    chunks.append(s[start:cut].strip())
+                    start = cut
+                    while start < len(s) and s[start].isspace():
+                        start += 1
+                if start < len(s):
+                    cur_parts, cur_len = [s[start:]], len(s) - start
             else:
-                if len(cur)+len(s) <= max_chars:
-                    cur += s
+                if cur_len + len(s) <= max_chars:
+                    cur_parts.append(s)
+                    cur_len += len(s)
                 else:
-                    chunks.append(cur.strip())
-                    cur = s
-        if cur:
-            chunks.append(cur.strip())
+                    chunks.append("".join(cur_parts).strip())
+                    cur_parts, cur_len = [s], len(s)
+        if cur_parts:
+            chunks.append("".join(cur_parts).strip())
     return [c for c in chunks if len(c) >= 5]
 
 
@@ -331,52 +526,91 @@ def create_debug_info_file(tmp_dir: str, idx: int, unique_id: str, info: dict):
         f.write(f"Timestamp: {datetime.now()}\n\n")
         f.write("Processing Order:\n")
         f.write("1. original_video (原始生成)\n")
-        f.write("2. extended_video (扩展时长，如需要)\n") 
-        f.write("3. aligned_video (精确对齐到音频)\n")
-        f.write("4. subtitled_video (添加字幕)\n")
-        f.write("5. final_segment (合并音频)\n\n")
+        f.write("2. subtitle (生成字幕文件)\n")
+        f.write("3. final_segment (对齐音频时长+字幕+合并音频+淡入淡出，一次编码)\n\n")
         for stage, data in info.get('stages', {}).items():
             f.write(f"--- {stage} ---\n")
             for key, value in data.items():
                 f.write(f"{key}: {value}\n")
             f.write("\n")
 
-def add_fade_in_out_to_segment(video_path: str, output_path: str, duration: float, fade: float = 0.5):
+_worker_state = threading.local()
+_worker_bots = []
+_worker_bots_lock = threading.Lock()
+
+
+def get_worker_bot() -> MultimodalNewsBot:
+    """每个工作线程只创建一次MultimodalNewsBot，后续分段复用其连接池和缓存"""
+    bot = getattr(_worker_state, "bot", None)
+    if bot is None:
+        bot = _worker_state.bot = MultimodalNewsBot()
+        with _worker_bots_lock:
+            _worker_bots.append(bot)
+    return bot
+
+
+def close_worker_bots():
+    """关闭本轮创建的所有bot（释放各自的提示词缓存数据库连接），之后的调用会重新创建"""
+    global _worker_state
+    with _worker_bots_lock:
+        bots = _worker_bots[:]
+        _worker_bots.clear()
+        _worker_state = threading.local()
+    for bot in bots:
+        bot.close()
+
+
+def segment_cache_path(seg_text: str, final_quality: bool = False) -> str:
     """
-    给单个片段加淡入淡出效果（视频和音频），默认各0.5秒
+    分段成片的缓存路径，由文本、所用模型/音色，以及所有影响输出的字幕、淡入淡出、规格和编码参数共同决定；
+    任何一项配置变化都会换用新的缓存，避免旧分段与新分段混在一起流复制拼接
     """
-    fade = min(fade, duration / 4)  # 防止fade时长过长
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", video_path,
-        "-vf",
-        f"fade=t=in:st=0:d={fade:.3f},fade=t=out:st={duration-fade:.3f}:d={fade:.3f}",
-        "-af",
-        f"afade=t=in:st=0:d={fade:.3f},afade=t=out:st={duration-fade:.3f}:d={fade:.3f}",
-        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
-        "-c:a", "aac", "-b:a", "128k",
-        # Add a slightly longer duration to ensure audio completes
-        "-t", f"{duration + 0.2:.3f}",
-        "-movflags", "+faststart",
-        output_path
-    ]
-    logging.info(f"Add fade-in/out: {fade:.2f}s for {video_path} → {output_path}")
-    run_cmd(cmd)
+    key_source = "\n".join([
+        seg_text,
+        API_CONFIG["llm_model"], API_CONFIG["image_model"], API_CONFIG["video_model"],
+        API_CONFIG["voice_type"],
+        "burn" if BURN_SUBTITLES else "soft",
+        "timeline" if TIMELINE_SUBTITLES else SUBTITLE_RENDERER,
+        ASS_HEADER, SUBTITLE_FORCE_STYLE, SUBTITLE_FONT,
+        str(TRANSITION_DURATION), str(SEGMENT_FPS), str(SEGMENT_FRAME_SIZE),
+        " ".join(segment_video_codec_args(final_quality)),
+    ])
+    key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SEGMENT_CACHE_ROOT, f"{key}.mp4")
+
 
 def generate_single_segment(args):
-    idx, seg_text, ts, tmp = args
+    idx, seg_text, ts, tmp, final_quality = args
     unique_id = generate_unique_id()
-    bot = MultimodalNewsBot()
+
+    # 0) 相同内容的分段已生成过则直接复用
+    cached_segment = segment_cache_path(seg_text, final_quality)
+    if os.path.exists(cached_segment):
+        try:
+            cached_duration = safe_get_media_duration(cached_segment)
+        except Exception as e:
+            logging.warning(f"[Seg {idx}] Cached segment unreadable, regenerating: {e}")
+        else:
+            if cached_duration > 0:
+                logging.info(f"[Seg {idx}] ♻️  Reusing cached segment: {cached_duration:.3f}s → {cached_segment}")
+                return idx, [(cached_segment, cached_duration)]
+
+    bot = get_worker_bot()
     debug_info = {
         'text': seg_text,
         'stages': {}
     }
     logging.info(f"[Seg {idx}] Processing: {seg_text[:50]}...")
     try:
-        # 1) 生成音频
-        audio_path = bot.generate_voice(seg_text, f"{ts}_{idx:02d}_{unique_id}")
+        # 1) 生成音频，同时提交视频生成：两者都是远程调用且互不依赖，耗时取两者较长者
+        #    （generate_news_report内部的同文本TTS会命中缓存，不会重复合成）
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as stage_executor:
+            audio_future = stage_executor.submit(bot.generate_voice, seg_text, f"{ts}_{idx:02d}_{unique_id}")
+            video_future = stage_executor.submit(wait_for_video_generation, bot, seg_text)
+            audio_path = audio_future.result()
+            res = video_future.result()
         audio_duration = bot.get_audio_duration(audio_path)
-        audio_info = get_media_info(audio_path)
+        audio_info = get_media_info(audio_path) if DEBUG_SEGMENTS else None
         debug_info['stages']['01_audio'] = {
             'path': audio_path,
             'duration': audio_duration,
@@ -384,8 +618,7 @@ def generate_single_segment(args):
         }
         logging.info(f"[Seg {idx}] Audio: {audio_duration:.3f}s → {audio_path}")
 
-        # 2) 生成视频（带重试机制）
-        res = wait_for_video_generation(bot, seg_text)
+        # 2) 视频（带重试机制）
         original_video = res["video_path"]
         original_duration = safe_get_media_duration(original_video)
         original_info = get_media_info(original_video)
@@ -396,94 +629,61 @@ def generate_single_segment(args):
         }
         logging.info(f"[Seg {idx}] Original: {original_duration:.3f}s → {original_video}")
 
-        # 3) 确定是否需要扩展
-        target_video_duration = max(audio_duration * VIDEO_BUFFER_RATIO, audio_duration + 0.3)
-        target_video_duration = min(target_video_duration, MAX_VIDEO_DURATION)
-        if original_duration < target_video_duration:
-            extended_video = os.path.join(tmp, f"seg_{idx:02d}_extended_{unique_id}.mp4")
-            extend_video_smoothly(original_video, target_video_duration, extended_video)
-            working_video = extended_video
-            extended_info = get_media_info(extended_video)
-            debug_info['stages']['03_extended_video'] = {
-                'path': extended_video,
-                'duration': safe_get_media_duration(extended_video),
-                'target_duration': target_video_duration,
-                'info': extended_info
-            }
-            logging.info(f"[Seg {idx}] Extended: {original_duration:.3f}s → {target_video_duration:.3f}s")
+        # 3) 生成字幕文件（drawtext方式把文本内联进滤镜，不写文件；整片字幕模式下分段不带字幕）
+        if TIMELINE_SUBTITLES or (BURN_SUBTITLES and SUBTITLE_RENDERER == "drawtext"):
+            srt_path = None
         else:
-            working_video = original_video
-            debug_info['stages']['03_extended_video'] = {
-                'note': 'No extension needed',
-                'original_sufficient': True
-            }
-            logging.info(f"[Seg {idx}] No extension needed: {original_duration:.3f}s")
-
-        # 4) 精确对齐到音频时长
-        aligned_video = os.path.join(tmp, f"seg_{idx:02d}_aligned_{unique_id}.mp4")
-        create_aligned_video(working_video, audio_duration, aligned_video)
-        aligned_duration = safe_get_media_duration(aligned_video)
-        aligned_info = get_media_info(aligned_video)
-        debug_info['stages']['04_aligned_video'] = {
-            'path': aligned_video,
-            'duration': aligned_duration,
-            'target_duration': audio_duration,
-            'precision_error': abs(aligned_duration - audio_duration),
-            'info': aligned_info
-        }
-        logging.info(f"[Seg {idx}] Aligned: {aligned_duration:.3f}s (target: {audio_duration:.3f}s)")
-
-        # 5) 生成字幕文件
-        srt_path = os.path.join(tmp, f"seg_{idx:02d}_{unique_id}.srt")
-        create_subtitle_file(seg_text, audio_duration, srt_path)
-        debug_info['stages']['05_subtitle'] = {
+            srt_path = os.path.join(tmp, f"seg_{idx:02d}_{unique_id}.ass")
+            create_ass_subtitle_file(seg_text, audio_duration, srt_path)
+        debug_info['stages']['03_subtitle'] = {
             'path': srt_path,
             'duration': audio_duration,
             'text': seg_text,
             'formatted_text': split_subtitle_text(seg_text)
         }
 
-        # 6) 添加字幕
-        video_with_subs = os.path.join(tmp, f"seg_{idx:02d}_subtitled_{unique_id}.mp4")
-        add_subtitles_to_video(aligned_video, srt_path, video_with_subs)
-        subtitled_duration = safe_get_media_duration(video_with_subs)
-        subtitled_info = get_media_info(video_with_subs)
-        debug_info['stages']['06_subtitled_video'] = {
-            'path': video_with_subs,
-            'duration': subtitled_duration,
-            'info': subtitled_info
-        }
-        logging.info(f"[Seg {idx}] Subtitled: {subtitled_duration:.3f}s")
-
-        # 7) 合并音视频
+        # 4) 对齐到音频时长、烧录字幕、合并音频并加淡入淡出，一次编码完成，不产生中间文件
         final_segment = os.path.join(tmp, f"seg_{idx:02d}_final_{unique_id}.mp4")
-        merge_audio_video_precise(video_with_subs, audio_path, final_segment)
-        final_duration = safe_get_media_duration(final_segment)
-        final_info = get_media_info(final_segment)
-        debug_info['stages']['07_final_segment'] = {
-            'path': final_segment,
-            'duration': final_duration,
-            'audio_duration': audio_duration,
-            'sync_error': abs(final_duration - audio_duration),
-            'info': final_info
-        }
+        target_duration = build_segment_in_one_pass(original_video, audio_path, srt_path, audio_duration, final_segment,
+                                                    fade=TRANSITION_DURATION,
+                                                    subtitle_text=None if TIMELINE_SUBTITLES else seg_text,
+                                                    final_quality=final_quality)
+        # 非调试模式直接采用-t指定的目标时长，省去一次ffprobe
+        final_duration = target_duration
+        if DEBUG_SEGMENTS:
+            final_duration = safe_get_media_duration(final_segment)
+            debug_info['stages']['04_final_segment'] = {
+                'path': final_segment,
+                'duration': final_duration,
+                'target_duration': target_duration,
+                'audio_duration': audio_duration,
+                'sync_error': abs(final_duration - target_duration),
+                'info': get_media_info(final_segment)
+            }
+        logging.info(f"[Seg {idx}] Final: {final_duration:.3f}s (audio: {audio_duration:.3f}s)")
 
-        # 7.5) 给单段加淡入淡出效果
-        fade_segment = os.path.join(tmp, f"seg_{idx:02d}_fade_{unique_id}.mp4")
-        add_fade_in_out_to_segment(final_segment, fade_segment, final_duration, fade=TRANSITION_DURATION)
+        if DEBUG_SEGMENTS:
+            # 5) 创建调试信息文件（失败的分段总会写出）
+            create_debug_info_file(tmp, idx, unique_id, debug_info)
 
-        # 8) 创建调试信息文件
-        create_debug_info_file(tmp, idx, unique_id, debug_info)
+            # 6) 验证实际输出时长与目标时长一致
+            sync_error = abs(final_duration - target_duration)
+            if sync_error > 0.05:
+                logging.warning(f"[Seg {idx}] ⚠️  Sync error: {sync_error:.3f}s (final={final_duration:.3f}s, target={target_duration:.3f}s)")
+            else:
+                logging.info(f"[Seg {idx}] ✅ Perfect sync: error={sync_error:.3f}s")
 
-        # 9) 验证同步
-        sync_error = abs(final_duration - audio_duration)
-        if sync_error > 0.05:
-            logging.warning(f"[Seg {idx}] ⚠️  Sync error: {sync_error:.3f}s (final={final_duration:.3f}s, audio={audio_duration:.3f}s)")
-        else:
-            logging.info(f"[Seg {idx}] ✅ Perfect sync: error={sync_error:.3f}s")
+        # 7) 写入缓存：先复制为临时文件再原子替换，避免中途崩溃留下不完整的缓存
+        try:
+            os.makedirs(SEGMENT_CACHE_ROOT, exist_ok=True)
+            partial = f"{cached_segment}.{unique_id}.tmp"
+            shutil.copyfile(final_segment, partial)
+            os.replace(partial, cached_segment)
+        except OSError as e:
+            logging.warning(f"[Seg {idx}] Failed to cache segment: {e}")
 
         logging.info(f"[Seg {idx}] ✅ Complete: {final_duration:.3f}s")
-        return idx, [(fade_segment, final_duration)]
+        return idx, [(final_segment, final_duration)]
 
     except Exception as e:
         logging.error(f"[Seg {idx}] ❌ Failed: {e}")
@@ -497,9 +697,11 @@ def generate_single_segment(args):
 def concat_videos_with_simple_transitions(videos: list[str],
                                           durations: list[float],
                                           out: str,
-                                          tdur: float = TRANSITION_DURATION):
+                                          tdur: float = TRANSITION_DURATION,
+                                          faststart: bool = False):
     """
     简单拼接所有视频片段，无转场，无音频重叠，单段自带淡入淡出。
+    faststart为True时把moov移到文件头，用于直接作为成片输出。
     """
     n = len(videos)
     if n == 0:
@@ -529,6 +731,7 @@ def concat_videos_with_simple_transitions(videos: list[str],
         "-safe", "0",
         "-i", concat_file,
         "-c", "copy",
+        *(["-movflags", "+faststart"] if faststart else []),
         out
     ]
     logging.info(f"Direct concatenation of {n} clips → {out}")
@@ -537,18 +740,30 @@ def concat_videos_with_simple_transitions(videos: list[str],
     if os.path.exists(concat_file):
         os.remove(concat_file)
 
-def add_gentle_intro_outro(video_path: str, output_path: str, total_duration: float):
+def add_gentle_intro_outro(video_path: str, output_path: str, total_duration: float,
+                           subtitle_path: str | None = None):
+    """subtitle_path为整片字幕时，在这次编码中一并烧录（BURN_SUBTITLES为False时封装为软字幕）"""
     fade_duration = min(1.0, total_duration / 20)
+    video_filter = ""
+    subtitle_inputs, subtitle_args = [], []
+    if subtitle_path and BURN_SUBTITLES:
+        video_filter = f"{subtitle_filter(subtitle_path)},"
+    elif subtitle_path:
+        subtitle_inputs = ["-i", os.path.abspath(subtitle_path)]
+        subtitle_args = ["-map", "0:v", "-map", "0:a", "-map", "1:s",
+                         "-c:s", "mov_text", "-metadata:s:s:0", "language=chi"]
     cmd = [
         "ffmpeg", "-y",
         "-i", video_path,
+        *subtitle_inputs,
+        *subtitle_args,
         "-vf", 
-        f"fade=t=in:st=0:d={fade_duration:.3f},"
+        f"{video_filter}fade=t=in:st=0:d={fade_duration:.3f},"
         f"fade=t=out:st={total_duration-fade_duration:.3f}:d={fade_duration:.3f}",
         "-af",
         f"afade=t=in:st=0:d={fade_duration:.3f},"
         f"afade=t=out:st={total_duration-fade_duration:.3f}:d={fade_duration:.3f}",
-        "-c:v", "libx264", "-preset", "medium", "-crf", "23",
+        *final_video_codec_args(),
         "-c:a", "aac", "-b:a", "128k",
         "-movflags", "+faststart",
         output_path
@@ -556,7 +771,29 @@ def add_gentle_intro_outro(video_path: str, output_path: str, total_duration: fl
     logging.info(f"Adding gentle intro/outro (fade: {fade_duration:.2f}s) → {output_path}")
     run_cmd(cmd)
 
-def generate_full_news_parallel(text: str, output_path: str = None) -> str:
+def persist_debug_files(tmp: str) -> str:
+    """
+    工作目录在内存盘上时，把调试信息文件拷回持久目录并释放内存盘上的整个工作目录，返回调试文件所在目录
+    """
+    if TMP_DIR_ROOT == PERSISTENT_TMP_DIR_ROOT:
+        return tmp
+    persistent = os.path.join(os.path.dirname(PERSISTENT_TMP_DIR_ROOT), os.path.basename(tmp))
+    try:
+        os.makedirs(persistent, exist_ok=True)
+        for name in os.listdir(tmp):
+            if name.endswith(".txt"):
+                shutil.copy2(os.path.join(tmp, name), persistent)
+        shutil.rmtree(tmp, ignore_errors=True)
+    except OSError as e:
+        logging.warning(f"Failed to persist debug files from {tmp}: {e}")
+        return tmp
+    return persistent
+
+
+def generate_full_news_parallel(text: str, output_path: str = None, intro_outro: bool = True) -> str:
+    """
+    intro_outro为False时不加整体淡入淡出，分段直接流复制拼接为成片，省去最终的整片重编码
+    """
     segs = smart_chunk_text(text)
     logging.info(f"Text split into {len(segs)} segments")
     for i, s in enumerate(segs, 1):
@@ -568,62 +805,101 @@ def generate_full_news_parallel(text: str, output_path: str = None) -> str:
     os.makedirs(tmp, exist_ok=True)
     logging.info(f"📁 Working directory: {tmp}")
 
-    tasks = [(i+1, segs[i], ts, tmp) for i in range(len(segs))]
-    results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(generate_single_segment, task): task[0] for task in tasks}
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                idx, parts = future.result()
-                if parts:
-                    results.append((idx, parts))
-                    logging.info(f"✅ Segment {idx} completed")
-                else:
-                    logging.warning(f"❌ Segment {idx} failed")
-            except Exception as e:
-                logging.error(f"❌ Segment error: {e}")
-
-    if not results:
-        raise RuntimeError("All segments failed to generate")
-
-    results.sort(key=lambda x: x[0])
-    all_videos = []
-    all_durations = []
-    for seg_idx, parts in results:
-        for video_path, duration in parts:
-            all_videos.append(video_path)
-            all_durations.append(duration)
-
-    total_duration = sum(all_durations)
-    success_count = len(results)
-    total_count = len(segs)
-
-    logging.info(f"✅ Generated {success_count}/{total_count} segments")
-    logging.info(f"📹 Total: {len(all_videos)} clips, {total_duration:.2f}s")
-
-    os.makedirs("output", exist_ok=True)
-
-    # 拼接
-    intermediate_output = f"output/news_with_transitions_{ts}_{unique_session}.mp4"
-    concat_videos_with_simple_transitions(all_videos, all_durations, intermediate_output)
-
-    # 总体intro/outro
-    if output_path is None:
-        final_output = f"output/full_news_{ts}_{unique_session}.mp4"
-    else:
-        final_output = output_path
-        # 确保输出目录存在
-        output_dir = os.path.dirname(final_output)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-    add_gentle_intro_outro(intermediate_output, final_output, total_duration)
-
-    # 清理中间文件
-    if os.path.exists(intermediate_output):
-        os.remove(intermediate_output)
+    try:
+        # 一次LLM调用批量改写所有分段的提示词，各分段生成时直接命中缓存
+        try:
+            get_worker_bot().prefetch_report_prompts(segs)
+        except Exception as e:
+            logging.warning(f"Prompt prefetch failed, segments will optimize individually: {e}")
+
+        # 不做整体淡入淡出时分段会直接拼接为成片，分段须按成片质量编码
+        stream_copy_final = not intro_outro and not TIMELINE_SUBTITLES
+        tasks = [(i+1, segs[i], ts, tmp, stream_copy_final) for i in range(len(segs))]
+        # 按文本长度从长到短提交（最长处理时间优先），减少尾部只剩一个长分段在跑的情况；结果稍后按idx排序
+        tasks.sort(key=lambda t: -len(t[1]))
+        results = []
+        pending_tasks = iter(tasks)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            # 同时在途的任务不超过MAX_WORKERS*2，每完成一个再补交一个，保持LPT提交顺序
+            running = {executor.submit(generate_single_segment, task)
+                       for task in itertools.islice(pending_tasks, MAX_WORKERS * 2)}
+            while running:
+                done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        idx, parts = future.result()
+                        if parts:
+                            results.append((idx, parts))
+                            logging.info(f"✅ Segment {idx} completed")
+                        else:
+                            logging.warning(f"❌ Segment {idx} failed")
+                    except Exception as e:
+                        logging.error(f"❌ Segment error: {e}")
+                for task in itertools.islice(pending_tasks, len(done)):
+                    running.add(executor.submit(generate_single_segment, task))
+
+        if not results:
+            raise RuntimeError("All segments failed to generate")
+
+        results.sort(key=lambda x: x[0])
+        all_videos = []
+        all_durations = []
+        for seg_idx, parts in results:
+            for video_path, duration in parts:
+                all_videos.append(video_path)
+                all_durations.append(duration)
+
+        total_duration = sum(all_durations)
+        success_count = len(results)
+        total_count = len(segs)
+
+        logging.info(f"✅ Generated {success_count}/{total_count} segments")
+        logging.info(f"📹 Total: {len(all_videos)} clips, {total_duration:.2f}s")
+
+        os.makedirs("output", exist_ok=True)
+
+        if output_path is None:
+            final_output = f"output/full_news_{ts}_{unique_session}.mp4"
+        else:
+            final_output = output_path
+            # 确保输出目录存在
+            output_dir = os.path.dirname(final_output)
+            if output_dir and not os.path.exists(output_dir):
+                os.makedirs(output_dir, exist_ok=True)
+
+        # 整片字幕：按拼接顺序累计各分段时长得到每条字幕的起止时间
+        timeline_subtitle = None
+        if TIMELINE_SUBTITLES:
+            cues, start = [], 0.0
+            for seg_idx, parts in results:
+                for _, duration in parts:
+                    cues.append((start, start + duration, segs[seg_idx - 1]))
+                    start += duration
+            timeline_subtitle = os.path.join(tmp, f"timeline_{unique_session}.ass")
+            write_ass_subtitle_file(cues, timeline_subtitle)
+
+        if stream_copy_final:
+            # 分段编码参数一致，流复制拼接即为成片
+            concat_videos_with_simple_transitions(all_videos, all_durations, final_output, faststart=True)
+        else:
+            # 拼接
+            intermediate_output = f"output/news_with_transitions_{ts}_{unique_session}.mp4"
+            concat_videos_with_simple_transitions(all_videos, all_durations, intermediate_output)
+
+            # 总体intro/outro
+            add_gentle_intro_outro(intermediate_output, final_output, total_duration,
+                                   subtitle_path=timeline_subtitle)
+
+            # 清理中间文件
+            if os.path.exists(intermediate_output):
+                os.remove(intermediate_output)
+    finally:
+        # 无论成功与否都把调试信息拷回持久目录，并释放内存盘上的工作目录
+        close_worker_bots()
+        tmp = persist_debug_files(tmp)
+        logging.info(f"🔍 Debug files in: {tmp}")
 
     logging.info(f"🎉 Final video with gentle transitions → {final_output}")
-    logging.info(f"🔍 Debug files in: {tmp}")
 
     return final_output
 
@@ -246,11 +246,14 @@ def main():
     )
     
     # 处理新闻
-    result = processor.process_news(
-        news_text=sample_news,
-        title="AI算法突破提升推理效率",
-        subtitle_format="srt"  # 可选: "srt", "ass", "vtt"
-    )
+    try:
+        result = processor.process_news(
+            news_text=sample_news,
+            title="AI算法突破提升推理效率",
+            subtitle_format="srt"  # 可选: "srt", "ass", "vtt"
+        )
+    finally:
+        processor.video_generator.close()
     
     # 打印结果
     print(f"\n处理结果摘要:")
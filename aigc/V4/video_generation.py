@@ -1,22 +1,219 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 import json
 import time
 import random
 import subprocess
-import base64
-import mimetypes
-from typing import List, Dict, Any, Optional, Tuple
+import shutil
+import io
+import mmap
+from typing import List, Dict, Any, Optional, Tuple, ClassVar, Literal
 from datetime import datetime
 from pathlib import Path
-from PIL import Image
+from functools import cached_property
 import math
-from langchain_openai import ChatOpenAI
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from langchain.prompts import ChatPromptTemplate
 
+try:
+    import pyvips  # 可选：libvips流式处理，JPEG编码比Pillow更快
+except ImportError:
+    pyvips = None
+
+try:
+    from pybase64 import b64encode  # 可选：SIMD加速的base64编码
+except ImportError:
+    from base64 import b64encode
+
+
+class TokenBucket:
+    """线程安全的令牌桶，用于在多个任务之间共享请求速率"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """初始化令牌桶
+        
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量，默认等于rate
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _retry_after_seconds(response) -> Optional[float]:
+    """解析响应中的Retry-After头（秒），无法解析时返回None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def _failed_before_send(error: requests.RequestException) -> bool:
+    """判断请求是否在发出之前就失败（连接超时、连接被拒绝、DNS解析失败），此时服务端一定未收到请求"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+def _download_to_file(session: requests.Session, url: str, file_path: str,
+                      chunk_size: int = 1 << 16) -> int:
+    """流式下载URL内容到文件，避免将整个响应读入内存
+    
+    Returns:
+        int: HTTP状态码，非200时不写入文件
+    """
+    with session.get(url, stream=True, timeout=(5, 60)) as response:
+        if response.status_code != 200:
+            return response.status_code
+        response.raw.decode_content = True
+        with open(file_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=chunk_size)
+        return response.status_code
+
+
+def _flatten_to_rgb(img):
+    """将带透明通道或非RGB模式的图片转换为白底RGB图片"""
+    from PIL import Image
+    
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def _load_as_jpeg(image_path: str, file_config: Dict[str, Any]) -> Tuple[str, bytes]:
+    """读取图片内容，非JPEG格式在内存中转换为JPEG
+    
+    转换时一并将超过max_image_dimension的图片缩小，解码、缩放、编码在一次处理中完成。
+    
+    Returns:
+        Tuple[str, bytes]: MIME类型和图片字节
+    """
+    mime_type = file_config["supported_image_formats"].get(Path(image_path).suffix.lower())
+    if not mime_type:
+        raise ValueError(f"不支持的图片格式: {image_path}")
+    
+    if mime_type == 'image/jpeg':
+        with open(image_path, "rb") as image_file:
+            return mime_type, image_file.read()
+    
+    print(f"检测到 {mime_type} 格式，正在转换为JPEG格式...")
+    
+    max_dimension = file_config["max_image_dimension"]
+    
+    if pyvips is not None:
+        # thumbnail在加载阶段直接缩小，不会解码出完整尺寸的像素
+        vimg = pyvips.Image.thumbnail(image_path, max_dimension, height=max_dimension, size='down')
+        if vimg.hasalpha():
+            vimg = vimg.flatten(background=[255, 255, 255])
+        if vimg.interpretation != 'srgb':
+            vimg = vimg.colourspace('srgb')
+        return 'image/jpeg', vimg.jpegsave_buffer(Q=file_config["jpeg_quality"], optimize_coding=True, strip=True)
+    
+    from PIL import Image
+    
+    with Image.open(image_path) as img:
+        img = _flatten_to_rgb(img)
+        img.thumbnail((max_dimension, max_dimension))
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=file_config["jpeg_quality"], optimize=True)
+    return 'image/jpeg', buffer.getvalue()
+
+
+def _to_data_uri(mime_type: str, data, file_config: Dict[str, Any]) -> str:
+    """校验图片大小并编码为base64 data URI，data可以是bytes或mmap等缓冲区对象"""
+    max_size = file_config["max_image_size_mb"] * 1024 * 1024
+    if len(data) > max_size:
+        raise ValueError(f"图片大小超出限制({file_config['max_image_size_mb']}MB): {len(data) / 1024 / 1024:.2f}MB")
+    # 前缀以bytes拼接，最后只做一次ASCII解码
+    return b"".join((b"data:", mime_type.encode("ascii"), b";base64,", b64encode(data))).decode("ascii")
+
+
+def _file_to_data_uri(image_path: str, mime_type: str, file_config: Dict[str, Any]) -> str:
+    """通过mmap直接对文件内容做base64编码，不先把整个文件读入内存"""
+    with open(image_path, "rb") as image_file:
+        if os.fstat(image_file.fileno()).st_size == 0:
+            raise ValueError(f"图片文件为空: {image_path}")
+        with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _to_data_uri(mime_type, mm, file_config)
+
+
+def _convert_and_b64(image_path: str, file_config: Dict[str, Any]) -> str:
+    """将图片转换为JPEG并编码为base64 data URI
+    
+    模块级函数，可在进程池中执行；转换结果保存在内存中，不写中间文件。
+    """
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"图片文件不存在: {image_path}")
+    
+    if file_config["supported_image_formats"].get(Path(image_path).suffix.lower()) == 'image/jpeg':
+        return _file_to_data_uri(image_path, 'image/jpeg', file_config)
+    
+    mime_type, data = _load_as_jpeg(image_path, file_config)
+    return _to_data_uri(mime_type, data, file_config)
+
+
 class VideoGenerator:
     """视频生成器，负责生成和处理视频"""
     
+    # 所有实例共享的任务状态查询限速，避免并发任务盲目轮询
+    _status_bucket = TokenBucket(rate=2)
+    
+    # 所有实例共享的图片/视频生成接口限速，主动控制请求速率而非撞到429后重试
+    _api_bucket = TokenBucket(rate=10)
+    _API_MAX_ATTEMPTS = 6
+    
+    # 提示词模板为常量，在类定义时解析一次，避免每次调用重复构建
+    _IMAGE_TMPL: ClassVar[ChatPromptTemplate] = ChatPromptTemplate.from_template(
+        """你是一个专业的AI图像提示词优化专家。请将以下新闻内容转化为详细的图像生成提示词，使其能够生成高质量的新闻配图。
+            提示词应该包含场景描述、风格、氛围、光线等要素，但不要包含任何不适合在新闻中展示的内容。
+            只返回优化后的提示词，不要有任何解释或其他内容。
+            
+            新闻内容：
+            {news_content}
+            """
+    )
+    
+    _VIDEO_TMPL: ClassVar[ChatPromptTemplate] = ChatPromptTemplate.from_template(
+        """你是一个专业的AI视频提示词优化专家。请将以下新闻内容转化为详细的视频生成提示词，使其能够生成高质量的新闻视频片段。
+            提示词应该包含场景描述、动作、转场、风格、氛围、光线等要素，但不要包含任何不适合在新闻中展示的内容。
+            视频时长为{duration}秒，请确保提示词适合这个时长。
+            只返回优化后的提示词，不要有任何解释或其他内容。
+            
+            新闻内容：
+            {news_content}
+            """
+    )
+    
     def __init__(self, output_dir: str = "output/videos", api_config: Dict[str, Any] = None):
         """初始化视频生成器
         
@@ -41,8 +238,8 @@ class VideoGenerator:
             "default_resolution": "720p",
             "default_ratio": "16:9",
             "supported_ratios": ["16:9", "1:1", "9:16"],
-            "max_wait_time": 300,  # 最大等待时间（秒）
-            "check_interval": 5    # 检查间隔（秒）
+            "max_wait_time": 300,      # 最大等待时间（秒）
+            "max_check_interval": 60   # 退避轮询的最大检查间隔（秒）
         }
         
         # 图片配置
@@ -61,6 +258,7 @@ class VideoGenerator:
         # 文件配置
         self.file_config = {
             "max_image_size_mb": 5,
+            "max_image_dimension": 1280,  # 转换时参考图最长边上限（像素）
             "jpeg_quality": 90,
             "supported_image_formats": {
                 ".jpg": "image/jpeg",
@@ -73,8 +271,35 @@ class VideoGenerator:
         if api_config:
             self.config.update(api_config)
         
-        # 初始化LLM用于提示词优化
-        self.llm = ChatOpenAI(
+        # 所有请求复用同一个连接池，避免轮询和下载时反复建立TCP/TLS连接。
+        # 认证头仍按请求传入，防止Bearer令牌随下载请求发往CDN。
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        
+        # 视频提示词缓存：(原始提示词, 时长分桶) -> 优化后的基础提示词
+        self._video_prompt_cache: Dict[Tuple[str, str], str] = {}
+        
+        # 本实例生成的图片格式记录，encode_image据此跳过格式判断和转换
+        self._asset_meta: Dict[str, Literal["jpg_clean", "png", "unknown"]] = {}
+    
+    def close(self):
+        """关闭共享的HTTP连接池"""
+        self.http.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @cached_property
+    def llm(self):
+        """用于提示词优化的LLM，首次使用时才导入并创建"""
+        from langchain_openai import ChatOpenAI
+        
+        return ChatOpenAI(
             temperature=0.0,
             model=self.config["llm_model"],
             openai_api_key=self.config["api_key"],
@@ -92,17 +317,7 @@ class VideoGenerator:
         """
         print("正在优化图片生成提示词...")
         
-        image_prompt_template = ChatPromptTemplate.from_template(
-            """你是一个专业的AI图像提示词优化专家。请将以下新闻内容转化为详细的图像生成提示词，使其能够生成高质量的新闻配图。
-            提示词应该包含场景描述、风格、氛围、光线等要素，但不要包含任何不适合在新闻中展示的内容。
-            只返回优化后的提示词，不要有任何解释或其他内容。
-            
-            新闻内容：
-            {news_content}
-            """
-        )
-        
-        messages = image_prompt_template.format_messages(news_content=original_prompt)
+        messages = self._IMAGE_TMPL.format_messages(news_content=original_prompt)
         response = self.llm.invoke(messages)
         
         optimized_prompt = response.content.strip()
@@ -120,33 +335,42 @@ class VideoGenerator:
         Returns:
             str: 优化后的提示词
         """
-        print("正在优化视频生成提示词...")
+        # 相邻时长的优化结果几乎相同，按分桶缓存，实际时长在本地补充
+        bucket, representative_duration = self._duration_bucket(duration)
+        cache_key = (original_prompt, bucket)
+        base_prompt = self._video_prompt_cache.get(cache_key)
         
-        video_prompt_template = ChatPromptTemplate.from_template(
-            """你是一个专业的AI视频提示词优化专家。请将以下新闻内容转化为详细的视频生成提示词，使其能够生成高质量的新闻视频片段。
-            提示词应该包含场景描述、动作、转场、风格、氛围、光线等要素，但不要包含任何不适合在新闻中展示的内容。
-            视频时长为{duration}秒，请确保提示词适合这个时长。
-            只返回优化后的提示词，不要有任何解释或其他内容。
+        if base_prompt is None:
+            print("正在优化视频生成提示词...")
             
-            新闻内容：
-            {news_content}
-            """
-        )
-        
-        messages = video_prompt_template.format_messages(
-            news_content=original_prompt,
-            duration=duration
-        )
-        response = self.llm.invoke(messages)
+            messages = self._VIDEO_TMPL.format_messages(
+                news_content=original_prompt,
+                duration=representative_duration
+            )
+            response = self.llm.invoke(messages)
+            base_prompt = response.content.strip()
+            self._video_prompt_cache[cache_key] = base_prompt
         
-        optimized_prompt = response.content.strip()
+        optimized_prompt = f"视频时长{duration}秒。{base_prompt}"
         print(f"优化后的视频提示词: {optimized_prompt}")
         
         return optimized_prompt
     
+    @staticmethod
+    def _duration_bucket(duration: int) -> Tuple[str, int]:
+        """将视频时长量化为缓存分桶
+        
+        Returns:
+            Tuple[str, int]: 分桶名称和请求LLM时使用的代表时长
+        """
+        if duration <= 7:
+            return "short", 6
+        return "long", 9
+    
     def generate_image(self, original_prompt: str, filename: Optional[str] = None,
                       size: str = None, ratio: str = None, 
-                      guidance_scale: float = None, seed: int = None) -> List[str]:
+                      guidance_scale: float = None, seed: int = None,
+                      output_format: str = "png") -> List[str]:
         """扩写提示词并生成图片
         
         Args:
@@ -156,6 +380,7 @@ class VideoGenerator:
             ratio: 图片比例
             guidance_scale: 引导强度
             seed: 随机种子
+            output_format: 保存格式，"png"或"jpg"；作为视频参考图时用"jpg"可省去后续转换
             
         Returns:
             List[str]: 生成的图片文件路径列表
@@ -199,7 +424,8 @@ class VideoGenerator:
         print(f"图片生成参数: {data}")
         
         try:
-            response = requests.post(
+            response = self._request(
+                "POST",
                 f"{self.config['base_url']}/images/generations",
                 headers=headers,
                 json=data
@@ -207,25 +433,39 @@ class VideoGenerator:
             response.raise_for_status()
             response_data = response.json()
             
-            saved_paths = []
-            
+            # 先确定所有下载目标，再并行下载，保持结果顺序
+            targets = []
             for i, image_data in enumerate(response_data.get("data", [])):
                 image_url = image_data.get("url")
                 if not image_url:
                     continue
                 
-                image_response = requests.get(image_url)
-                if image_response.status_code != 200:
-                    print(f"下载图像失败: {image_response.status_code}")
-                    continue
-                
                 if len(response_data.get("data", [])) > 1:
                     file_path = os.path.join(self.output_dir, f"{filename}_{i}.png")
                 else:
                     file_path = os.path.join(self.output_dir, f"{filename}.png")
+                targets.append((image_url, file_path))
+            
+            if not targets:
+                return []
+            
+            with ThreadPoolExecutor(max_workers=min(8, len(targets))) as executor:
+                status_codes = list(executor.map(lambda t: _download_to_file(self.http, *t), targets))
+            
+            saved_paths = []
+            for (image_url, file_path), status_code in zip(targets, status_codes):
+                if status_code != 200:
+                    print(f"下载图像失败: {status_code}")
+                    continue
                 
-                with open(file_path, 'wb') as f:
-                    f.write(image_response.content)
+                self._asset_meta[file_path] = "png"
+                if output_format == "jpg":
+                    # 单张转换失败时保留下载的原图，不影响其他图片
+                    try:
+                        file_path = self._reencode_as_jpeg(file_path)
+                        self._asset_meta[file_path] = "jpg_clean"
+                    except Exception as e:
+                        print(f"图像转换为JPEG失败，保留原图: {e}")
                 
                 print(f"图像已保存: {file_path}")
                 saved_paths.append(file_path)
@@ -237,65 +477,81 @@ class VideoGenerator:
             return []
     
     def get_mimetype(self, file_path):
-        """获取文件的MIME类型"""
-        mime_type, _ = mimetypes.guess_type(file_path)
-        if not mime_type or not mime_type.startswith('image/'):
-            ext = Path(file_path).suffix.lower()
-            mime_type = self.file_config["supported_image_formats"].get(ext)
-        
+        """获取文件的MIME类型，直接按扩展名查表，无需加载系统mimetypes数据库"""
+        mime_type = self.file_config["supported_image_formats"].get(Path(file_path).suffix.lower())
         if not mime_type:
             raise ValueError(f"不支持的图片格式: {file_path}")
         return mime_type
 
-    def convert_to_jpeg_if_needed(self, image_path):
-        """如果图片不是JPEG格式，转换为JPEG格式"""
+    def convert_to_jpeg_if_needed(self, image_path) -> Tuple[str, bytes]:
+        """如果图片不是JPEG格式，在内存中转换为JPEG格式
+        
+        Returns:
+            Tuple[str, bytes]: MIME类型和图片字节，转换失败时返回原始内容
+        """
         try:
-            mime_type = self.get_mimetype(image_path)
-            
-            if mime_type == 'image/jpeg':
-                return image_path
-            
-            print(f"检测到 {mime_type} 格式，正在转换为JPEG格式...")
-            
-            with Image.open(image_path) as img:
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                jpeg_path = os.path.splitext(image_path)[0] + '_converted.jpg'
-                img.save(jpeg_path, 'JPEG', quality=self.file_config["jpeg_quality"], optimize=True)
-                print(f"图片已转换并保存为: {jpeg_path}")
-                
-                return jpeg_path
-                
+            return _load_as_jpeg(image_path, self.file_config)
         except Exception as e:
             print(f"图片格式转换失败: {e}")
-            return image_path
+            with open(image_path, "rb") as image_file:
+                return self.get_mimetype(image_path), image_file.read()
 
     def encode_image(self, image_path):
         """将图片编码为base64格式"""
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"图片文件不存在: {image_path}")
         
-        processed_image_path = self.convert_to_jpeg_if_needed(image_path)
-        
-        file_size = os.path.getsize(processed_image_path)
-        max_size = self.file_config["max_image_size_mb"] * 1024 * 1024
+        # 本实例生成的JPEG无需再判断格式或转换
+        if self._asset_meta.get(image_path) == "jpg_clean" or self.get_mimetype(image_path) == 'image/jpeg':
+            return _file_to_data_uri(image_path, 'image/jpeg', self.file_config)
         
-        if file_size > max_size:
-            raise ValueError(f"图片大小超出限制({self.file_config['max_image_size_mb']}MB): {file_size / 1024 / 1024:.2f}MB")
+        mime_type, data = self.convert_to_jpeg_if_needed(image_path)
+        return _to_data_uri(mime_type, data, self.file_config)
+    
+    def _reencode_as_jpeg(self, image_path: str) -> str:
+        """将生成的图片转为JPEG另存（原图保留），先写临时文件再原子替换，返回JPEG路径"""
+        _, data = _load_as_jpeg(image_path, self.file_config)
+        jpeg_path = os.path.splitext(image_path)[0] + ".jpg"
+        tmp_path = f"{jpeg_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, jpeg_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return jpeg_path
+    
+    def _encode_reference_images(self, image_paths: List[str]) -> List[str]:
+        """编码参考图像，多张图片时在临时进程池中并行转换以利用多核，进程数不超过图片数
         
-        mime_type = self.get_mimetype(processed_image_path)
+        Args:
+            image_paths: 参考图片路径列表
+            
+        Returns:
+            List[str]: 成功编码的图片data URI列表，保持输入顺序
+        """
+        if len(image_paths) <= 1:
+            return self._collect_reference_images([(path, None) for path in image_paths])
         
-        with open(processed_image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-            data_uri = f"data:{mime_type};base64,{encoded_string}"
-            return data_uri
+        with ProcessPoolExecutor(max_workers=min(len(image_paths), os.cpu_count() or 1)) as pool:
+            jobs = [(path, pool.submit(_convert_and_b64, path, self.file_config))
+                    for path in image_paths]
+            return self._collect_reference_images(jobs)
+    
+    def _collect_reference_images(self, jobs) -> List[str]:
+        """按顺序收集编码结果，future为None的任务在当前进程内编码，失败的图片跳过"""
+        image_data_list = []
+        for image_path, future in jobs:
+            try:
+                if future is None:
+                    image_data_list.append(_convert_and_b64(image_path, self.file_config))
+                else:
+                    image_data_list.append(future.result())
+            except Exception as e:
+                print(f"处理参考图像失败: {e}")
+        return image_data_list
     
     def validate_duration(self, audio_duration: float) -> int:
         """验证并调整视频时长，确保是5-10之间的整数且比音频长"""
@@ -352,12 +608,7 @@ class VideoGenerator:
         image_data_list = []
         if image_paths and len(image_paths) > 0:
             print(f"处理 {len(image_paths)} 张参考图像...")
-            for image_path in image_paths:
-                try:
-                    image_data = self.encode_image(image_path)
-                    image_data_list.append(image_data)
-                except Exception as e:
-                    print(f"处理参考图像失败: {e}")
+            image_data_list = self._encode_reference_images(image_paths)
         
         # 步骤4: 生成视频
         headers = {
@@ -381,7 +632,8 @@ class VideoGenerator:
         
         try:
             # 发送视频生成请求
-            response = requests.post(
+            response = self._request(
+                "POST",
                 f"{self.config['base_url']}/videos/generations",
                 headers=headers,
                 json=data
@@ -397,51 +649,118 @@ class VideoGenerator:
             print(f"视频生成任务已提交，任务ID: {task_id}")
             
             # 轮询检查任务状态
-            status_url = f"{self.config['base_url']}/videos/generations/{task_id}"
-            wait_time = 0
+            status_data = self._await_video(task_id, headers)
             
-            while wait_time < self.video_config["max_wait_time"]:
-                time.sleep(self.video_config["check_interval"])
-                wait_time += self.video_config["check_interval"]
-                
-                status_response = requests.get(
-                    status_url,
-                    headers=headers
-                )
-                
-                if status_response.status_code != 200:
-                    print(f"检查任务状态失败: {status_response.status_code}")
-                    continue
-                
-                status_data = status_response.json()
-                status = status_data.get("status")
-                
-                print(f"任务状态: {status} (等待时间: {wait_time}秒)")
-                
-                if status == "completed":
-                    # 获取视频URL并下载
-                    video_url = status_data.get("result", {}).get("url")
-                    if not video_url:
-                        raise ValueError("未能获取视频URL")
-                    
-                    video_response = requests.get(video_url)
-                    if video_response.status_code != 200:
-                        raise ValueError(f"下载视频失败: {video_response.status_code}")
-                    
-                    # 保存视频文件
-                    video_path = os.path.join(self.output_dir, f"{filename}.mp4")
-                    with open(video_path, 'wb') as f:
-                        f.write(video_response.content)
-                    
-                    print(f"视频已保存: {video_path}")
-                    return video_path
-                    
-                elif status == "failed":
-                    error_message = status_data.get("error", {}).get("message", "未知错误")
-                    raise ValueError(f"视频生成失败: {error_message}")
+            # 获取视频URL并下载
+            video_url = status_data.get("result", {}).get("url")
+            if not video_url:
+                raise ValueError("未能获取视频URL")
             
-            raise TimeoutError(f"视频生成超时，已等待 {wait_time} 秒")
+            # 流式保存视频文件
+            video_path = os.path.join(self.output_dir, f"{filename}.mp4")
+            status_code = _download_to_file(self.http, video_url, video_path)
+            if status_code != 200:
+                raise ValueError(f"下载视频失败: {status_code}")
+            
+            print(f"视频已保存: {video_path}")
+            return video_path
             
         except Exception as e:
             print(f"视频生成过程中出错: {e}")
-            return ""
\ No newline at end of file
+            return ""
+    
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """带共享限速和重试的API请求
+        
+        GET等幂等请求在429、5xx和网络错误时按带抖动的指数退避重试（1~30秒），
+        响应带Retry-After时以其为准。POST等非幂等请求（如创建生成任务）只在429
+        或请求未发出（连接失败）时重试，避免服务端已受理时重复创建付费任务；
+        其余响应直接返回、异常直接抛出给调用方处理。
+        
+        Args:
+            method: HTTP方法
+            url: 请求地址
+            **kwargs: 传给requests的其他参数
+            
+        Returns:
+            requests.Response: 最后一次请求的响应
+        """
+        idempotent = method.upper() in ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+        for attempt in range(1, self._API_MAX_ATTEMPTS + 1):
+            backoff = random.uniform(1, min(30, 2 ** attempt))
+            self._api_bucket.acquire()
+            try:
+                response = self.http.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self._API_MAX_ATTEMPTS or not (idempotent or _failed_before_send(e)):
+                    raise
+                print(f"请求出错: {e}，{backoff:.1f}秒后重试 ({attempt}/{self._API_MAX_ATTEMPTS})")
+                time.sleep(backoff)
+                continue
+            
+            if response.status_code != 429 and (response.status_code < 500 or not idempotent):
+                return response
+            if attempt == self._API_MAX_ATTEMPTS:
+                return response
+            
+            retry_after = _retry_after_seconds(response)
+            delay = retry_after if retry_after is not None else backoff
+            print(f"请求返回 {response.status_code}，{delay:.1f}秒后重试 ({attempt}/{self._API_MAX_ATTEMPTS})")
+            time.sleep(delay)
+    
+    def _await_video(self, task_id: str, headers: Dict[str, str]) -> Dict[str, Any]:
+        """轮询视频生成任务直到完成
+        
+        采用带全抖动的指数退避（1, 2, 4, ... 最多max_check_interval秒），
+        遇到429限流时优先遵循服务端返回的Retry-After。
+        
+        Args:
+            task_id: 视频生成任务ID
+            headers: 请求头
+            
+        Returns:
+            Dict[str, Any]: 任务完成时的状态数据
+        """
+        status_url = f"{self.config['base_url']}/videos/generations/{task_id}"
+        max_interval = self.video_config["max_check_interval"]
+        start = time.monotonic()
+        deadline = start + self.video_config["max_wait_time"]
+        attempt = 0
+        
+        while time.monotonic() < deadline:
+            delay = random.uniform(0, min(max_interval, 2 ** attempt))
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+            attempt += 1
+            
+            self._status_bucket.acquire()
+            try:
+                # 设置超时，挂起的连接不会让退避轮询永远卡住，超时后按退避继续查询
+                status_response = self.http.get(status_url, headers=headers, timeout=(5, 30))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                print(f"检查任务状态出错: {e}")
+                continue
+            wait_time = time.monotonic() - start
+            
+            if status_response.status_code == 429:
+                retry_after = _retry_after_seconds(status_response)
+                print(f"任务状态查询被限流 (等待时间: {wait_time:.0f}秒)")
+                if retry_after is not None:
+                    time.sleep(min(retry_after, max(0.0, deadline - time.monotonic())))
+                continue
+            
+            if status_response.status_code != 200:
+                print(f"检查任务状态失败: {status_response.status_code}")
+                continue
+            
+            status_data = status_response.json()
+            status = status_data.get("status")
+            
+            print(f"任务状态: {status} (等待时间: {wait_time:.0f}秒)")
+            
+            if status == "completed":
+                return status_data
+            elif status == "failed":
+                error_message = status_data.get("error", {}).get("message", "未知错误")
+                raise ValueError(f"视频生成失败: {error_message}")
+        
+        raise TimeoutError(f"视频生成超时，已等待 {time.monotonic() - start:.0f} 秒")